@@ -0,0 +1,224 @@
+"""
+Buffered, structured event log shared by all phases.
+
+Callers append records to an in-memory ring buffer and return immediately;
+a background thread writes them to a JSONL file in batches (one open/write
+per flush instead of per error) and rotates the file by size. Every record
+carries the stage, batch id, error class and duration, and per-stage /
+per-error-class counters are kept in memory so hot failure modes can be
+reported without grepping the log.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+EVENT_LOG_PATH = os.path.join("data", "logs", "events.jsonl")
+
+
+class EventLog:
+    def __init__(
+        self,
+        path: str = EVENT_LOG_PATH,
+        capacity: int = 10000,
+        flush_interval: float = 1.0,
+        flush_size: int = 500,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 5,
+        echo_limit: int = 3,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.echo_limit = echo_limit
+        self.recent = deque(maxlen=capacity)  # last N records, for inspection
+        self.dropped = 0
+        self._pending = deque()
+        self._capacity = capacity
+        self._counts: Counter = Counter()
+        self._durations: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._logged = 0  # records accepted so far
+        self._written = 0  # records accepted before the last completed write
+        self._flush_requested = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, name="event-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- recording ---
+
+    def log(self, stage: str, message: str = "", level: str = "info", batch=None,
+            error_class: Optional[str] = None, duration: Optional[float] = None, **fields):
+        record = {
+            "ts": round(time.time(), 3),
+            "level": level,
+            "stage": stage,
+            "batch": batch,
+            "error_class": error_class,
+            "duration": round(duration, 4) if duration is not None else None,
+            "message": message,
+        }
+        record.update(fields)
+        key = (stage, level, error_class)
+        with self._cond:
+            self._counts[key] += 1
+            seen = self._counts[key]
+            if duration is not None:
+                self._durations[stage] = self._durations.get(stage, 0.0) + duration
+            if len(self._pending) >= self._capacity:
+                self._pending.popleft()  # writer fell behind: keep the newest records
+                self.dropped += 1
+            self._pending.append(record)
+            self._logged += 1
+            self.recent.append(record)
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+        # Print the first few of each failure mode; the rest only go to the file and the summary
+        if level == "error" and seen <= self.echo_limit:
+            suffix = " (further occurrences logged only)" if seen == self.echo_limit else ""
+            where = stage if batch is None else f"{stage} batch={batch}"
+            prefix = f"{error_class}: " if error_class and not message.startswith(error_class) else ""
+            print(f"[ERROR LOG] {where}: {prefix}{message}{suffix}")
+
+    def error(self, stage: str, message: str = "", error: Optional[BaseException] = None, **kwargs):
+        if error is not None:
+            kwargs.setdefault("error_class", type(error).__name__)
+            message = message or str(error)
+        self.log(stage, message, level="error", **kwargs)
+
+    @contextmanager
+    def timed(self, stage: str, batch=None, **fields):
+        """Record how long a block took; an exception is logged as an error and re-raised."""
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, error=e, batch=batch, duration=time.monotonic() - started, **fields)
+            raise
+        self.log(stage, "done", batch=batch, duration=time.monotonic() - started, **fields)
+
+    # --- writing ---
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                # Wait for a full batch, the flush interval, an explicit flush() or close()
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._flush_requested or len(self._pending) >= self.flush_size):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = list(self._pending)
+                self._pending.clear()
+                upto = self._logged
+                self._flush_requested = False
+                closed = self._closed
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    print(f"[ERROR LOG] could not write {self.path}: {e}")
+            with self._cond:
+                self._written = upto
+                self._cond.notify_all()
+            if closed:
+                return
+
+    def _write(self, records: List[dict]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._rotate_if_needed()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+
+    def _rotate_if_needed(self):
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def flush(self, timeout: float = 5.0):
+        """Block until everything logged so far is on disk."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._logged
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._written < target and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+
+    # --- reporting ---
+
+    def summary(self) -> dict:
+        """Event counts by stage and level, error counts by stage and error class, total seconds by stage."""
+        with self._cond:
+            counts = dict(self._counts)
+            durations = dict(self._durations)
+        by_stage: Dict[str, Dict[str, int]] = {}
+        errors: Dict[str, Dict[str, int]] = {}
+        for (stage, level, error_class), n in counts.items():
+            by_stage.setdefault(stage, {}).setdefault(level, 0)
+            by_stage[stage][level] += n
+            if level == "error":
+                stage_errors = errors.setdefault(stage, {})
+                stage_errors[error_class or "unknown"] = stage_errors.get(error_class or "unknown", 0) + n
+        return {
+            "by_stage": by_stage,
+            "errors": errors,
+            "seconds_by_stage": {k: round(v, 3) for k, v in durations.items()},
+            "dropped": self.dropped,
+        }
+
+
+def summarize_file(path: str = EVENT_LOG_PATH) -> Dict[str, Dict[str, int]]:
+    """Error counts by stage and error class across a log file and its rotated backups."""
+    totals: Dict[str, Counter] = {}
+    paths = [path] + [f"{path}.{i}" for i in range(1, 100) if os.path.exists(f"{path}.{i}")]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("level") == "error":
+                    totals.setdefault(record.get("stage") or "unknown", Counter())[record.get("error_class") or "unknown"] += 1
+    return {stage: dict(counter) for stage, counter in totals.items()}
+
+
+_event_log: Optional[EventLog] = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log() -> EventLog:
+    global _event_log
+    with _event_log_lock:
+        if _event_log is None:
+            _event_log = EventLog()
+        return _event_log
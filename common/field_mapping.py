@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from difflib import SequenceMatcher, get_close_matches
+from typing import Callable, Dict, List, Optional, Tuple
+
+from common.llm_cache import get_llm_cache
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+MAPPING_STORE_PATH = os.path.join(REPO_ROOT, "data", "cache", "field_mappings.json")
+
+# Canonical field -> known raw spellings (compared after normalize_field_name)
+SYNONYMS: Dict[str, List[str]] = {
+    "square_feet": ["sqft", "sq_ft", "square_feet", "square_footage", "building_area", "building_sqft",
+                    "bldg_sqft", "bldg_area", "gross_area", "gross_building_area", "building_size",
+                    "floor_area", "total_sqft", "living_area", "char_bldg_sf", "bldg_sf", "sf"],
+    "land_square_feet": ["land_sqft", "lot_size", "lot_area", "land_area", "lot_sqft", "char_land_sf", "land_sf"],
+    "zoning": ["zoning", "zoning_code", "zone", "zone_code", "zoning_classification", "zoning_class",
+               "land_use_code", "use_code", "zoning_district"],
+    "property_type": ["property_type", "prop_type", "property_class", "class", "property_use", "land_use",
+                      "use_type", "building_type", "property_category", "use_description", "class_description"],
+    "year_built": ["year_built", "yr_built", "built_year", "construction_year", "char_yrblt", "yrblt"],
+    "age": ["age", "building_age", "property_age", "age_years"],
+    "address": ["address", "property_address", "site_address", "street_address", "situs_address",
+                "full_address", "addr", "location_address", "property_description", "prop_address"],
+    "city": ["city", "municipality", "town", "property_city"],
+    "zip_code": ["zip", "zip_code", "zipcode", "postal_code", "property_zip"],
+    "parcel_id": ["pin", "parcel_id", "parcel_number", "apn", "parcel", "pin14", "account_number"],
+    "latitude": ["latitude", "lat", "y_coordinate", "centroid_y"],
+    "longitude": ["longitude", "lon", "lng", "long", "x_coordinate", "centroid_x"],
+    "sale_price": ["sale_price", "price", "sales_price", "sold_price", "sale_amount"],
+    "sale_date": ["sale_date", "sold_date", "date_of_sale", "deed_date"],
+    "assessed_value": ["assessed_value", "assessment", "av", "certified_tot", "total_assessed_value"],
+    "owner_name": ["owner", "owner_name", "taxpayer_name", "mailing_name"],
+}
+
+# Token-level abbreviations expanded before matching
+ABBREVIATIONS = {
+    "sq": "square", "ft": "feet", "sqft": "square_feet", "bldg": "building", "yr": "year", "yrs": "years",
+    "addr": "address", "prop": "property", "lng": "longitude", "lon": "longitude", "lat": "latitude",
+    "zn": "zoning", "cls": "class", "no": "number", "num": "number", "amt": "amount",
+}
+
+# Logical roles requested by Phase 2/3 -> canonical fields that can fill them, in preference order
+ROLE_CANONICALS: Dict[str, List[str]] = {
+    "zoning": ["zoning"],
+    "property_type": ["property_type"],
+    "square_feet": ["square_feet"],
+    "size": ["square_feet"],
+    "age": ["age", "year_built"],
+    "address": ["address"],
+    "latitude": ["latitude"],
+    "longitude": ["longitude"],
+}
+
+ROLE_DESCRIPTIONS = {
+    "zoning": "zoning or use code column (zoning codes look like M1, M2, I-1, etc.)",
+    "property_type": "property type or use column (e.g., industrial, office, etc)",
+    "square_feet": "building square footage column",
+    "size": "building size in square feet",
+    "age": "property age or year built column",
+    "address": "a field with an address or property description",
+    "latitude": "latitude coordinate",
+    "longitude": "longitude coordinate",
+}
+
+FUZZY_CUTOFF = 0.85
+FUZZY_TOKEN_CUTOFF = 0.8
+
+
+def normalize_field_name(name: str) -> str:
+    """'BldgSqFt' / 'bldg-sq ft' / 'bldg_sqft' all normalize to 'building_square_feet'."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(name).strip().lstrip(":"))
+    tokens = [t for t in re.split(r"[^0-9a-zA-Z]+", text.lower()) if t]
+    expanded = []
+    for token in tokens:
+        expanded.extend(ABBREVIATIONS.get(token, token).split("_"))
+    return "_".join(expanded)
+
+
+def tokens_agree(a: str, b: str, cutoff: float = FUZZY_TOKEN_CUTOFF) -> bool:
+    """Same number of tokens, each a near spelling of one in the other name: a typo, not a different word."""
+    tokens_a, tokens_b = a.split("_"), b.split("_")
+    if len(tokens_a) != len(tokens_b):
+        return False
+    return all(max(SequenceMatcher(None, x, y).ratio() for y in tokens_b) >= cutoff for x in tokens_a)
+
+
+def schema_fingerprint(fields) -> str:
+    return hashlib.sha256("\n".join(sorted(str(f) for f in fields)).encode("utf-8")).hexdigest()[:16]
+
+
+def strip_code_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        first_newline = text.find("\n")
+        text = text[first_newline + 1:] if first_newline != -1 else ""
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+class FieldMapper:
+    """
+    Deterministic raw-field -> canonical-field resolver.
+    Lookup order: confirmed store, exact synonym, token-set match, fuzzy match.
+    Anything still unresolved can be sent to an LLM in one batched call, and
+    every confirmed answer is persisted per schema fingerprint so repeat runs
+    never leave the process.
+    """
+
+    def __init__(self, store_path: str = MAPPING_STORE_PATH, synonyms: Optional[Dict[str, List[str]]] = None):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._lookup: Dict[str, str] = {}
+        self._token_lookup: Dict[Tuple[str, ...], str] = {}
+        for canonical, names in (synonyms or SYNONYMS).items():
+            for name in names + [canonical]:
+                self._add_synonym(name, canonical)
+        self.store = self._load_store()
+        for normalized, canonical in self.store.get("fields", {}).items():
+            self._add_synonym(normalized, canonical)
+
+    def _add_synonym(self, name: str, canonical: str):
+        normalized = normalize_field_name(name)
+        self._lookup.setdefault(normalized, canonical)
+        self._token_lookup.setdefault(tuple(sorted(normalized.split("_"))), canonical)
+
+    def _load_store(self) -> dict:
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                store = json.load(f)
+        except (OSError, ValueError):
+            store = {}
+        store.setdefault("fields", {})
+        store.setdefault("schemas", {})
+        return store
+
+    def _save_store(self):
+        os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+        tmp = self.store_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.store, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.store_path)
+
+    def match(self, field: str) -> Tuple[Optional[str], float, str]:
+        """Return (canonical, confidence, method) for one raw field name."""
+        normalized = normalize_field_name(field)
+        if normalized in self._lookup:
+            return self._lookup[normalized], 1.0, "synonym"
+        tokens = tuple(sorted(normalized.split("_")))
+        if tokens in self._token_lookup:
+            return self._token_lookup[tokens], 0.95, "tokens"
+        # confirm() may add synonyms from another thread while the fuzzy scan walks them
+        with self._lock:
+            lookup = dict(self._lookup)
+        # A close overall ratio alone maps bldg_use to building_size, so the differing tokens must be typos too
+        for close in get_close_matches(normalized, lookup.keys(), n=5, cutoff=FUZZY_CUTOFF):
+            if tokens_agree(normalized, close):
+                return lookup[close], round(SequenceMatcher(None, normalized, close).ratio(), 3), "fuzzy"
+        return None, 0.0, "unresolved"
+
+    def confirm(self, mapping: Dict[str, str], fields=None, learned: Optional[Dict[str, str]] = None):
+        """
+        Persist a schema's mapping under its fingerprint. Pairs in `learned`
+        (e.g. LLM answers) also become synonyms for every future schema.
+        """
+        with self._lock:
+            for field, canonical in (learned or {}).items():
+                normalized = normalize_field_name(field)
+                self.store["fields"][normalized] = canonical
+                self._add_synonym(normalized, canonical)
+            if fields is not None:
+                entry = self.store["schemas"].setdefault(schema_fingerprint(fields), {})
+                entry.setdefault("fields", {}).update(mapping)
+            self._save_store()
+
+    def map_fields(self, fields: List[str], llm_fallback: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> Dict[str, str]:
+        """Map every raw field to a canonical name; only unknown fields reach llm_fallback."""
+        cached = self.store["schemas"].get(schema_fingerprint(fields), {}).get("fields")
+        if cached and all(f in cached for f in fields):
+            return {f: cached[f] for f in fields}
+
+        mapping: Dict[str, str] = {}
+        unresolved = []
+        for field in fields:
+            canonical, _, _ = self.match(field)
+            if canonical:
+                mapping[field] = canonical
+            else:
+                unresolved.append(field)
+
+        learned = {}
+        answered_by_llm = False
+        if unresolved and llm_fallback is not None:
+            try:
+                learned = {k: v for k, v in (llm_fallback(unresolved) or {}).items() if k in unresolved and v}
+                answered_by_llm = True
+            except Exception:
+                learned = {}
+        mapping.update(learned)
+        if answered_by_llm:
+            for field in unresolved:
+                # The LLM had no better name, so the field keeps its own (normalized) name
+                mapping.setdefault(field, normalize_field_name(field))
+
+        # Only remember fields resolved here or weighed by the LLM; after a failed call the rest is asked again
+        self.confirm(mapping, fields, learned)
+        return {f: mapping.get(f) or normalize_field_name(f) for f in fields}
+
+    def resolve_roles(
+        self,
+        columns: List[str],
+        roles: List[str],
+        sample_rows: Optional[List[dict]] = None,
+        llm_fallback: Optional[Callable[[List[str], List[str], Optional[List[dict]]], Dict[str, Optional[str]]]] = None,
+    ) -> Dict[str, Optional[str]]:
+        """
+        Pick the column that plays each logical role (e.g. zoning, size, age).
+        Returns {role: column or None}; only roles nothing matched are sent to llm_fallback.
+        """
+        columns = [str(c) for c in columns]
+        fingerprint = schema_fingerprint(columns)
+        role_key = ",".join(sorted(roles))
+        cached = self.store["schemas"].get(fingerprint, {}).get("roles", {}).get(role_key)
+        if cached is not None:
+            return dict(cached)
+
+        candidates: Dict[str, List[Tuple[int, float, str]]] = {}
+        for column in columns:
+            canonical, confidence, _ = self.match(column)
+            for role in roles:
+                preferred = ROLE_CANONICALS.get(role, [role])
+                if canonical in preferred:
+                    candidates.setdefault(role, []).append((preferred.index(canonical), -confidence, column))
+
+        resolved: Dict[str, Optional[str]] = {}
+        for role in roles:
+            options = sorted(candidates.get(role, []))
+            resolved[role] = options[0][2] if options else None
+
+        if "zoning" in roles and resolved["zoning"] is None:
+            resolved["zoning"] = _sniff_zoning_column(columns, sample_rows)
+
+        missing = [r for r in roles if resolved.get(r) is None]
+        answered_by_llm = False
+        if missing and llm_fallback is not None:
+            try:
+                answer = llm_fallback(columns, missing, sample_rows) or {}
+                answered_by_llm = True
+            except Exception:
+                answer = {}
+            for role in missing:
+                column = answer.get(role)
+                if column in columns:
+                    resolved[role] = column
+
+        # Only remember complete answers or ones the LLM has already weighed in on
+        if not missing or answered_by_llm:
+            with self._lock:
+                entry = self.store["schemas"].setdefault(fingerprint, {})
+                entry.setdefault("roles", {})[role_key] = resolved
+                self._save_store()
+        return resolved
+
+
+ZONING_VALUE_PATTERN = re.compile(r"^\s*(M|I|C|R|B|PD|PMD)[- ]?\d", re.IGNORECASE)
+
+
+def _sniff_zoning_column(columns: List[str], sample_rows: Optional[List[dict]]) -> Optional[str]:
+    """Fall back to values: a column whose samples mostly look like zoning codes (M1, I-2, ...)."""
+    if not sample_rows:
+        return None
+    best, best_share = None, 0.5
+    for column in columns:
+        values = [str(r.get(column)) for r in sample_rows if r.get(column) not in (None, "")]
+        if not values:
+            continue
+        share = sum(1 for v in values if ZONING_VALUE_PATTERN.match(v) and len(v) <= 12) / len(values)
+        if share > best_share:
+            best, best_share = column, share
+    return best
+
+
+# === LLM fallbacks (one batched call for whatever the local engine could not resolve) ===
+def llm_map_fields(fields: List[str], model: str = "gpt-4.1") -> Dict[str, str]:
+    prompt = (
+        "You are a data analyst assistant. Given a list of raw API field names, map each one to its most likely standardized version.\n\n"
+        f"Known standardized names: {sorted(SYNONYMS)}\n"
+        f"Raw fields: {fields}\n\n"
+        "Return ONLY a JSON dictionary where the keys are the original fields and values are the standardized names."
+    )
+    text = get_llm_cache().complete(prompt, model=model, temperature=0)
+    result = json.loads(strip_code_fences(text))
+    return result if isinstance(result, dict) else {}
+
+
+def llm_resolve_roles(columns: List[str], roles: List[str], sample_rows: Optional[List[dict]] = None,
+                      model: str = "gpt-4.1") -> Dict[str, Optional[str]]:
+    described = "\n".join(f"- {role} = {ROLE_DESCRIPTIONS.get(role, role)}" for role in roles)
+    prompt = (
+        "These are the columns in a real estate dataset:\n"
+        f"{columns}\n\n"
+        "Here are a few sample rows:\n"
+        f"{json.dumps(sample_rows or [], indent=2, default=str)}\n\n"
+        "Which columns best match the following logical fields (return as JSON, use null if missing):\n"
+        f"{described}\n"
+        "Return JSON like: {" + ", ".join(f'"{r}": "..."' for r in roles) + "}."
+    )
+    text = get_llm_cache().complete(prompt, model=model, temperature=0)
+    result = json.loads(strip_code_fences(text))
+    return result if isinstance(result, dict) else {}
+
+
+_mapper: Optional[FieldMapper] = None
+_mapper_lock = threading.Lock()
+
+
+def get_mapper() -> FieldMapper:
+    global _mapper
+    with _mapper_lock:
+        if _mapper is None:
+            _mapper = FieldMapper()
+        return _mapper
@@ -0,0 +1,202 @@
+"""
+Content-addressed cache for LLM completions shared by all phases.
+
+Responses are keyed on model + temperature + a hash of the prompt, so an
+identical prompt is only paid for once. Lookups go through a small
+in-memory LRU first and a SQLite file second; the SQLite tier drops entries
+older than the TTL and trims the least recently used ones once the stored
+responses exceed the size budget.
+
+LLM_CACHE_MODE selects the behaviour:
+  on      read and write the cache (default)
+  replay  answer only from the cache and raise LLMCacheMiss instead of calling
+          the API, for deterministic reruns and tests without network access
+  off     always call the API and store nothing
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+# Under the repo root, not the working directory, so every phase shares one cache
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+LLM_CACHE_PATH = os.path.join(REPO_ROOT, "data", "cache", "llm_responses.sqlite")
+CACHE_MODES = ("on", "replay", "off")
+
+
+class LLMCacheMiss(LookupError):
+    """Raised in replay mode when a prompt has no stored response."""
+
+
+def cache_key(model: str, temperature: float, prompt: str) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\x00{float(temperature)!r}\x00{prompt_hash}".encode("utf-8")).hexdigest()
+
+
+def _openai_complete(prompt: str, model: str, temperature: float) -> str:
+    from langchain_openai import ChatOpenAI
+
+    response = ChatOpenAI(model=model, temperature=temperature).invoke(prompt)
+    return response.content if hasattr(response, "content") else str(response)
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evicted: int = 0
+
+    def as_dict(self) -> dict:
+        stats = asdict(self)
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        stats["hit_rate"] = round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        mode: str = "on",
+        memory_size: int = 256,
+        max_bytes: int = 100 * 1024 * 1024,
+        ttl: Optional[float] = 30 * 24 * 3600,
+        evict_every: int = 100,
+        complete_fn: Callable[[str, str, float], str] = _openai_complete,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode {mode!r}; expected one of {CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.memory_size = memory_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self.complete_fn = complete_fn
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if mode != "off":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, temperature REAL, response TEXT,"
+                " size INTEGER, created REAL, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._db.commit()
+
+    # --- tiers ---
+
+    def _remember(self, key: str, response: str):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return self._memory[key]
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.stats.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = "", temperature: float = 0.0):
+        with self._lock:
+            self._remember(key, response)
+            if self._db is None:
+                return
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, float(temperature), response, len(response.encode("utf-8")), now, now),
+            )
+            self._db.commit()
+            self.stats.writes += 1
+            if self.stats.writes % self.evict_every == 0:
+                self._evict()
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until the stored responses fit max_bytes."""
+        evicted = 0
+        if self.ttl is not None:
+            evicted += self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)).rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            freed = 0
+            stale = []
+            for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                stale.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            self._db.executemany("DELETE FROM responses WHERE key = ?", stale)
+            evicted += len(stale)
+        self._db.commit()
+        self.stats.evicted += evicted
+
+    def evict(self):
+        if self._db is not None:
+            with self._lock:
+                self._evict()
+
+    # --- completions ---
+
+    def complete(self, prompt: str, model: str = "gpt-4.1", temperature: float = 0.0) -> str:
+        """The response text for a prompt, from the cache when possible."""
+        key = cache_key(model, temperature, prompt)
+        if self.mode != "off":
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+        with self._lock:
+            self.stats.misses += 1
+        if self.mode == "replay":
+            raise LLMCacheMiss(f"No cached {model} response for prompt {key[:12]} (LLM_CACHE_MODE=replay)")
+        response = self.complete_fn(prompt, model, temperature)
+        if self.mode != "off":
+            self.put(key, response, model, temperature)
+        return response
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+
+_llm_cache: Optional[LLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Process-wide cache; LLM_CACHE_MODE and LLM_CACHE_PATH override the defaults."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache(
+                path=os.getenv("LLM_CACHE_PATH", LLM_CACHE_PATH),
+                mode=os.getenv("LLM_CACHE_MODE", "on").lower(),
+            )
+        return _llm_cache
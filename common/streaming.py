@@ -0,0 +1,239 @@
+"""
+Constant-memory readers for raw property exports and processed output.
+
+JSON arrays, GeoJSON FeatureCollections, NDJSON and CSV are parsed
+incrementally and handed out as bounded DataFrame chunks, so a multi-GB
+county export never has to fit in memory (or be held twice, as text and
+as a frame) before it is batched. Parquet files and partitioned Parquet
+directories are read with column pruning and predicate pushdown.
+"""
+import io
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Parquet input
+    ds = pq = None
+
+READ_CHARS = 1 << 20  # characters pulled from disk per refill
+PROCESSED_DIR = os.path.join("data", "processed")
+
+
+def default_output_format() -> str:
+    return "parquet" if pq is not None else "csv"
+
+
+def output_path(fmt: str, partitioned: bool = False) -> str:
+    """Where Phase 2 writes its processed output, relative to the repo root it runs from."""
+    name = "processed_data" if partitioned or fmt == "parquet" else "processed_data.csv"
+    return os.path.join(PROCESSED_DIR, name + (".parquet" if fmt == "parquet" and not partitioned else ""))
+
+
+def detect_format(path: str) -> str:
+    """'csv', 'ndjson', 'parquet' or 'json' (arrays, GeoJSON and other objects), by extension then content."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet" or os.path.isdir(path):
+        return "parquet"
+    if ext == ".csv":
+        return "csv"
+    if ext in (".ndjson", ".jsonl"):
+        return "ndjson"
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(64 * 1024)
+    stripped = head.lstrip()
+    if not stripped or stripped[0] not in "[{":
+        return "csv"
+    if stripped[0] == "{":
+        # One complete object per line means NDJSON, whatever the extension says
+        first, _, rest = stripped.partition("\n")
+        try:
+            json.loads(first)
+            if rest.lstrip().startswith("{"):
+                return "ndjson"
+        except ValueError:
+            pass
+    return "json"
+
+
+class _JSONStream:
+    """Incremental tokenizer over a text file: just enough to walk arrays and top-level objects."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"Malformed JSON: expected one of {chars!r}, found {ch or 'end of file'!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number or literal ending exactly at the buffer edge may continue in the next read
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array_items(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def _feature_record(feature: dict) -> dict:
+    record = dict(feature.get("properties") or {})
+    geometry = feature.get("geometry") or {}
+    if geometry.get("type") == "Point" and len(geometry.get("coordinates") or []) >= 2:
+        record.setdefault("longitude", geometry["coordinates"][0])
+        record.setdefault("latitude", geometry["coordinates"][1])
+    return record
+
+
+def iter_json_records(path: str) -> Iterator[dict]:
+    """
+    Records from a JSON array or a GeoJSON FeatureCollection, one at a time.
+    Any other top-level object is read whole and expanded like DataFrame.from_dict.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JSONStream(f)
+        first = stream.peek()
+        if first == "[":
+            for item in stream.array_items():
+                if isinstance(item, dict):
+                    yield item
+            return
+        stream.expect("{")
+        other: Dict[str, object] = {}
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == "features" and stream.peek() == "[":
+                # Stream the features array; whatever follows it is metadata we do not need
+                for feature in stream.array_items():
+                    if isinstance(feature, dict):
+                        yield _feature_record(feature)
+                return
+            other[key] = stream.value()
+            if stream.expect(",}") == "}":
+                break
+        for record in pd.DataFrame.from_dict(other).to_dict(orient="records"):
+            yield record
+
+
+def _records_frame(records: List[dict]) -> pd.DataFrame:
+    """
+    Records as a DataFrame typed the way pd.read_json types them (numeric strings become numbers,
+    date-named columns dates), so a JSON or GeoJSON export gives the same dtypes as its NDJSON twin.
+    """
+    return pd.read_json(io.StringIO(json.dumps(records)), orient="records")
+
+
+def _parquet_dataset(path: str):
+    if ds is None:
+        raise ImportError("pyarrow is required to read Parquet (pip install pyarrow)")
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+
+def _parquet_filter(filters):
+    """[(column, op, value), ...] (pyarrow's DNF tuples) as a dataset expression."""
+    return pq.filters_to_expression(filters) if filters else None
+
+
+def iter_frames(path: str, chunk_size: int = 50000, fmt: Optional[str] = None,
+                columns: Optional[List[str]] = None, filters=None) -> Iterator[pd.DataFrame]:
+    """
+    Yield DataFrames of at most `chunk_size` rows from a CSV, NDJSON, JSON, GeoJSON or Parquet file.
+    `columns` limits what is returned; for Parquet only those columns are read and `filters`
+    ([(column, op, value), ...]) skip row groups and partitions using their statistics.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == "parquet":
+        dataset = _parquet_dataset(path)
+        for batch in dataset.to_batches(columns=columns, filter=_parquet_filter(filters), batch_size=chunk_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+    if filters:
+        raise ValueError("filters are only supported for Parquet input")
+    select = (lambda df: df[[c for c in columns if c in df.columns]]) if columns else (lambda df: df)
+    if fmt == "csv":
+        with pd.read_csv(path, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield select(chunk)
+        return
+    if fmt == "ndjson":
+        with pd.read_json(path, lines=True, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield select(chunk)
+        return
+    batch: List[dict] = []
+    for record in iter_json_records(path):
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield select(_records_frame(batch))
+            batch = []
+    if batch:
+        yield select(_records_frame(batch))
+
+
+def read_frame(path: str, chunk_size: int = 50000, fmt: Optional[str] = None,
+               columns: Optional[List[str]] = None, filters=None) -> pd.DataFrame:
+    """Whole file as one DataFrame, built chunk by chunk so the raw text is never held alongside it."""
+    fmt = fmt or detect_format(path)
+    if fmt == "parquet":
+        return _parquet_dataset(path).to_table(columns=columns, filter=_parquet_filter(filters)).to_pandas()
+    chunks = list(iter_frames(path, chunk_size, fmt, columns, filters))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def read_sample(path: str, rows: int = 5, fmt: Optional[str] = None) -> pd.DataFrame:
+    """The first few rows with every column, for schema inference before a pruned full read."""
+    fmt = fmt or detect_format(path)
+    if fmt == "parquet":
+        return _parquet_dataset(path).head(rows).to_pandas()
+    return next(iter_frames(path, rows, fmt), pd.DataFrame())
@@ -0,0 +1,128 @@
+"""
+Phase 1 ingestion benchmark against the local mock API (no network needed).
+
+For each dataset size a mock server and a client run in separate processes; the
+client runs the probe + ingest_to_sink (resumable NDJSON sink, failed-page
+retries, background profiling) path from main.py and reports records/sec,
+p50/p99 request latency, retries and peak RSS (Unix only).
+
+    python benchmark.py --sizes 10000,100000,1000000 --latency-ms 20 --rate-429 0.02 --flaky 0.01
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Unix-only: peak RSS is not reported on Windows
+    resource = None
+
+from tools.http_client import ResponseCache, cached_get, get_session
+from tools.profiler import StreamingProfiler
+from tools.sink import ingest_to_sink
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def run_client(api_url, page_size, max_workers):
+    """Measured side: runs in its own process so peak RSS belongs to the client alone."""
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.monotonic()
+        cached_get(api_url, cache=ResponseCache(cache_dir=os.path.join(tmp, "cache")))
+        probe_sec = time.monotonic() - started
+
+        # Every request the ingest makes, retries and throttled ones included
+        get_session().hooks["response"].append(
+            lambda response, *args, **kwargs: latencies.append(response.elapsed.total_seconds()))
+        result = ingest_to_sink(api_url, path=os.path.join(tmp, "raw_input.ndjson"), profiler=StreamingProfiler(),
+                                page_size=page_size, max_workers=max_workers, progress_every=0)
+
+    stats = result["throughput"]
+    return {
+        "records": stats["records"],
+        "records_per_sec": stats["records_per_sec"],
+        "elapsed_sec": stats["elapsed_sec"],
+        "probe_sec": round(probe_sec, 3),
+        "pages": stats["pages_ok"],
+        "failed_pages": len(result["failed_pages"]),
+        "retries": stats["retries"],
+        "peak_in_flight": stats["peak_in_flight"],
+        "p50_request_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_request_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+    }
+
+
+def start_mock(rows, args):
+    cmd = [sys.executable, os.path.join(SCRIPT_DIR, "mock_api_server.py"), "--rows", str(rows), "--port", "0",
+           "--latency-ms", str(args.latency_ms), "--latency-jitter-ms", str(args.latency_jitter_ms),
+           "--rate-429", str(args.rate_429), "--retry-after", str(args.retry_after), "--flaky", str(args.flaky)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().strip()  # "Serving N rows on <url>"
+    return proc, line.rsplit(" ", 1)[-1]
+
+
+def run_size(rows, args):
+    server, api_url = start_mock(rows, args)
+    try:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--client", api_url,
+             "--page-size", str(args.page_size), "--max-workers", str(args.max_workers)],
+            capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+    result["rows"] = rows
+    return result
+
+
+def format_table(results):
+    cols = ["rows", "records", "records_per_sec", "elapsed_sec", "p50_request_ms", "p99_request_ms",
+            "retries", "failed_pages", "peak_in_flight", "peak_rss_mb"]
+    lines = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+    for r in results:
+        lines.append("| " + " | ".join(str(r.get(c, "")) for c in cols) + " |")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Phase 1 ingestion against the local mock API")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated row counts (e.g. up to 5000000)")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--flaky", type=float, default=0.0)
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    parser.add_argument("--client", help=argparse.SUPPRESS)  # internal: measured client process
+    args = parser.parse_args()
+
+    if args.client:
+        print(json.dumps(run_client(args.client, args.page_size, args.max_workers)))
+        sys.exit(0)
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"→ Benchmarking {size:,} rows...", flush=True)
+        results.append(run_size(size, args))
+    print("\n" + format_table(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -1,6 +1,13 @@
-import os
+import argparse
+import hashlib
 import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 from tools.tools import (
     inspect_api_schema_tool,
@@ -11,6 +18,11 @@ from tools.tools import (
     batching_and_retry_tool,
     api_documentation_generator_tool,
 )
+from tools.http_client import get_cache, get_session
+from common.events import get_event_log
+from tools.sink import RAW_NDJSON_PATH as RAW_DATA_PATH
+from tools.profiler import StreamingProfiler
+from tools.delta import DEFAULT_KEY_FIELD, DEFAULT_UPDATED_FIELD, sync_endpoint
 
 load_dotenv()
 
@@ -20,51 +32,78 @@ Path("data/processed").mkdir(parents=True, exist_ok=True)
 Path("data/logs").mkdir(parents=True, exist_ok=True)
 Path("outputs").mkdir(parents=True, exist_ok=True)
 
+REPORT_PATH = "outputs/structured_api_report.md"
 
-def main():
-    api_url = input("Enter API endpoint (e.g. https://...): ").strip()
+
+def run_pipeline(api_url, args, raw_path=RAW_DATA_PATH, report_path=REPORT_PATH, log=print):
+    """Run discovery and ingestion for one endpoint. Returns a summary row for batch mode."""
+    started = time.monotonic()
 
     # === 1. Inspect API Schema ===
-    print("[1] Inspecting schema...")
+    log("[1] Inspecting schema...")
     schema = inspect_api_schema_tool.invoke(api_url)
-    print("→ Fields discovered:", list(schema.keys())[:5])
+    log("→ Fields discovered:", list(schema.keys())[:5])
 
     # === 2. Map Field Variations ===
-    print("[2] Mapping field name variations...")
+    log("[2] Mapping field name variations...")
     fields = list(schema.keys()) if isinstance(schema, dict) else []
     field_mapping = field_variation_mapper_tool.invoke({"input": {"fields": fields}})
 
 
     # === 3. Check Auth Requirements ===
-    print("[3] Checking authentication requirements...")
+    log("[3] Checking authentication requirements...")
     auth_info = auth_requirement_checker_tool.invoke(api_url)
 
     # === 4. Detect Rate Limits ===
-    print("[4] Checking rate limit headers...")
+    log("[4] Checking rate limit headers...")
     rate_limits = rate_limit_detector_tool.invoke(api_url)
 
     # === 5. Check for Missing/Inconsistent Fields ===
-    print("[5] Analyzing missing data...")
+    log("[5] Analyzing missing data...")
     missing_data = missing_data_detector_tool.invoke(api_url)
 
     # === 6. Intelligent Batching and Retry ===
-    print("[6] Fetching full dataset in batches (3 pages)...")
-    batch_result = batching_and_retry_tool.invoke(api_url)
-    records = batch_result.get("records", [])
-
-# === 7. Save Raw JSON Data ===
-    print("[7] Saving raw data...")
+    # === 7. Stream Raw Data to NDJSON ===
+    log("[6] Fetching full dataset with concurrent paging...")
+    log(f"[7] Streaming raw data to {raw_path}...")
     try:
-        raw_path = "data/raw/raw_input.json"
-        with open(raw_path, "w", encoding="utf-8") as f:
-            json.dump(records, f, indent=2)
-        print(f"→ Raw dataset saved to: {raw_path}")
+        if args.sync:
+            profiler = StreamingProfiler()
+            batch_result = sync_endpoint(
+                api_url,
+                path=raw_path,
+                key_field=args.key_field,
+                updated_field=args.updated_field,
+                deleted_field=args.deleted_field,
+                full=args.full,
+                profiler=profiler,
+            )
+            batch_result["profile"] = profiler.to_dict()
+            log(f"→ Sync mode: {batch_result['mode']}")
+            if batch_result["mode"] == "delta":
+                log(f"→ {batch_result['changed_records']} changed records since {batch_result['watermark_before']}")
+        else:
+            batch_result = batching_and_retry_tool.invoke({"api_url": api_url, "output_path": raw_path})
+        if batch_result.get("resumed_from_offset"):
+            log(f"→ Resumed interrupted ingest from offset {batch_result['resumed_from_offset']}")
+        log(f"→ {batch_result['records_fetched']} records saved, throughput: {batch_result['throughput']}")
+        if batch_result["failed_pages"]:
+            failed_offsets = [p["offset"] for p in batch_result["failed_pages"]]
+            log(f"→ {len(failed_offsets)} pages failed after retries (re-run to retry them), "
+                f"offsets {failed_offsets[:10]}; first error: {batch_result['failed_pages'][0]['error']}")
     except Exception as e:
-        with open("data/logs/error.log", "a") as f:
-            f.write(f"Raw data save failed: {str(e)}\n")
+        batch_result = {"error": str(e)}
+        get_event_log().error("ingest", f"Raw data ingest failed: {e}", error=e, endpoint=api_url)
+
+    # Replace probe-based schema/missing stats with the full-dataset profile built during paging
+    profile = batch_result.pop("profile", None)
+    if profile and profile["records"]:
+        schema = {k: v["type"] for k, v in profile["fields"].items()}
+        missing_data = {k: v["missing_pct"] for k, v in profile["fields"].items()}
+        log(f"→ Profiled {profile['records']} records across {len(schema)} fields")
 
     # === 8. Generate Markdown Report ===
-    print("[8] Generating structured Markdown report...")
+    log("[8] Generating structured Markdown report...")
     metadata = {
         "schema": schema,
         "field_mapping": field_mapping,
@@ -72,15 +111,145 @@ def main():
         "rate_limits": rate_limits,
         "missing_data": missing_data,
         "batching_result": batch_result,
+        "profile": profile,
     }
 
     markdown = api_documentation_generator_tool.invoke({"metadata": metadata})
 
-    output_path = "outputs/structured_api_report.md"
-    with open(output_path, "w", encoding="utf-8") as f:
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
         f.write(markdown)
-    print(f" Documentation saved to: {output_path}")
+    log(f" Documentation saved to: {report_path}")
+
+    return {
+        "endpoint": api_url,
+        "status": summary_status(batch_result),
+        "records": batch_result.get("records_fetched", 0),
+        "failed_pages": len(batch_result.get("failed_pages", [])),
+        "seconds": round(time.monotonic() - started, 2),
+        "raw_path": raw_path,
+        "report_path": report_path,
+        "error": batch_result.get("error"),
+    }
+
+
+def summary_status(batch_result):
+    if "error" in batch_result:
+        return "error"
+    if batch_result.get("failed_pages"):
+        return "partial" if batch_result.get("records_fetched") else "error"
+    return "ok"
+
+
+def endpoint_slug(api_url):
+    """
+    Filesystem-safe namespace for one endpoint, e.g. datacatalog.cookcountyil.gov_resource_3r7i-mrz4.
+    URLs that differ only in their query (another $where, say) get a short hash of it appended.
+    """
+    parts = urlsplit(api_url)
+    path = os.path.splitext(parts.path)[0]
+    slug = re.sub(r"[^A-Za-z0-9.-]+", "_", f"{parts.netloc}{path}").strip("_") or "endpoint"
+    if parts.query:
+        slug += "_" + hashlib.sha256(parts.query.encode("utf-8")).hexdigest()[:8]
+    return slug
+
+
+def load_endpoint_manifest(path):
+    """Endpoints from a JSON list (strings or {"url": ...} objects) or a text file with one URL per line."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        entries = json.loads(text)
+        return [e["url"] if isinstance(e, dict) else str(e) for e in entries]
+    except ValueError:
+        return [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith("#")]
+
+
+def run_batch(endpoints, args):
+    """
+    Run the pipeline over many endpoints concurrently.
+    At most args.max_endpoints run at once overall and args.per_host per host;
+    a failing endpoint is recorded in the summary and never stops the others.
+    """
+    endpoints = list(dict.fromkeys(endpoints))  # drop duplicates, keep order
+    get_session(pool_size=max(16, args.max_endpoints * 8))
+    host_limits = {}
+    host_lock = threading.Lock()
+
+    def host_semaphore(api_url):
+        host = urlsplit(api_url).netloc
+        with host_lock:
+            if host not in host_limits:
+                host_limits[host] = threading.Semaphore(args.per_host)
+            return host_limits[host]
+
+    def run_one(api_url):
+        slug = endpoint_slug(api_url)
+        raw_path = os.path.join("data", "raw", slug, "raw_input.ndjson")
+        report_path = os.path.join("outputs", slug, "structured_api_report.md")
+        started = time.monotonic()
+        with host_semaphore(api_url):
+            try:
+                return run_pipeline(api_url, args, raw_path, report_path, log=lambda *a: print(f"[{slug}]", *a))
+            except Exception as e:
+                get_event_log().error("pipeline", f"Pipeline failed: {e}", error=e, endpoint=api_url,
+                                      duration=time.monotonic() - started)
+                return {"endpoint": api_url, "status": "error", "records": 0, "failed_pages": 0,
+                        "seconds": round(time.monotonic() - started, 2), "raw_path": raw_path,
+                        "report_path": report_path, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=args.max_endpoints) as pool:
+        rows = list(pool.map(run_one, endpoints))
+
+    table = format_summary(rows)
+    print("\n" + table)
+    errors = get_event_log().summary()["errors"]
+    if errors:
+        print(f"Errors by stage and class (details in data/logs/events.jsonl): {errors}")
+    with open(os.path.join("outputs", "batch_summary.md"), "w", encoding="utf-8") as f:
+        f.write("# Batch Ingestion Summary\n\n" + table + "\n")
+    return rows
+
+
+def format_summary(rows):
+    lines = [
+        "| Endpoint | Status | Records | Failed pages | Seconds | Raw data |",
+        "|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        status = row["status"] if not row.get("error") else f"{row['status']}: {row['error'][:60]}"
+        lines.append(f"| {row['endpoint']} | {status} | {row['records']} | {row['failed_pages']} | "
+                     f"{row['seconds']} | {row['raw_path']} |")
+    total_records = sum(r["records"] for r in rows)
+    ok = sum(1 for r in rows if r["status"] == "ok")
+    lines.append(f"| **{len(rows)} endpoints** | {ok} ok | {total_records} | "
+                 f"{sum(r['failed_pages'] for r in rows)} | {max((r['seconds'] for r in rows), default=0)} | |")
+    return "\n".join(lines)
+
+
+def main(args):
+    get_cache().evict_expired()
+    endpoints = list(args.urls or [])
+    if args.manifest:
+        endpoints.extend(load_endpoint_manifest(args.manifest))
+    if endpoints:
+        run_batch(endpoints, args)
+        return
+    api_url = input("Enter API endpoint (e.g. https://...): ").strip()
+    run_pipeline(api_url, args)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Discover and ingest a property data API")
+    parser.add_argument("--sync", action="store_true", help="Only fetch records changed since the last run (hard deletes are not detected)")
+    parser.add_argument("--full", action="store_true", help="With --sync, force a full re-pull and reset the watermark")
+    parser.add_argument("--key-field", default=DEFAULT_KEY_FIELD, help="Record key used to upsert changed rows")
+    parser.add_argument("--updated-field", default=DEFAULT_UPDATED_FIELD, help="Updated-at column used as the watermark")
+    parser.add_argument("--deleted-field", default=None,
+                        help="Column flagging deleted rows, if the source has one; without it --sync cannot see deletes "
+                             "and removed rows stay until a --full re-pull")
+    parser.add_argument("--manifest", help="File listing endpoints to process in batch (JSON list or one URL per line)")
+    parser.add_argument("--urls", nargs="+", help="Endpoints to process in batch")
+    parser.add_argument("--max-endpoints", type=int, default=4, help="Endpoints processed concurrently in batch mode")
+    parser.add_argument("--per-host", type=int, default=2, help="Concurrent endpoints allowed per host in batch mode")
+    main(parser.parse_args())
@@ -0,0 +1,178 @@
+"""
+Local stand-in for a Socrata-style county property API.
+
+Serves deterministic synthetic property records as JSON, CSV or GeoJSON with
+$limit/$offset paging, plus optional latency, 429s with Retry-After, 401s and
+flaky pages, so Phase 1 can be tuned and benchmarked without network access.
+
+    python mock_api_server.py --rows 100000 --port 8766 --latency-ms 40 --rate-429 0.05
+    # then: http://127.0.0.1:8766/resource/mock.json
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PROPERTY_TYPES = ["Industrial Warehouse", "Light Industrial", "Manufacturing", "Flex Industrial",
+                  "Distribution Center", "Office", "Retail", "Multi-Family"]
+ZONING_CODES = ["M1", "M2", "M1-A", "I-1", "I-2", "I-2(PD)", "PMD-4", "5-1", "C1", "C2", "B3", "R3", "RS-3"]
+STREETS = ["Industrial Blvd", "Manufacturing St", "Commerce Dr", "Logistics Way", "Rail Yard Rd", "Main St"]
+UPDATED_AT = "2024-01-01T00:00:00.000"
+
+
+@dataclass
+class MockConfig:
+    rows: int = 10000
+    max_limit: int = 50000
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    rate_429: float = 0.0
+    retry_after: float = 1.0
+    flaky: float = 0.0
+    require_token: bool = False
+    seed: int = 7
+
+
+def make_record(i: int, seed: int = 7) -> dict:
+    """Record i is a pure function of (i, seed), so 5M rows cost no memory."""
+    rng = random.Random(seed * 1_000_003 + i)
+    year_built = rng.randint(1920, 2022)
+    return {
+        ":id": f"row-{i:08d}",
+        ":updated_at": UPDATED_AT,
+        "pin": f"{rng.randint(10**13, 10**14 - 1)}",
+        "property_type": rng.choice(PROPERTY_TYPES),
+        "zoning": rng.choice(ZONING_CODES),
+        "bldg_sqft": str(rng.randint(2_000, 400_000)) if rng.random() > 0.03 else None,
+        "year_built": str(year_built),
+        "address": f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+        "latitude": str(round(41.64 + rng.random() * 0.38, 6)),
+        "longitude": str(round(-87.94 + rng.random() * 0.42, 6)),
+        "sale_price": str(rng.randint(100_000, 40_000_000)),
+    }
+
+
+def to_csv(records) -> str:
+    buf = io.StringIO()
+    fields = list(make_record(0).keys())
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(records)
+    return buf.getvalue()
+
+
+def to_geojson(records) -> str:
+    features = []
+    for r in records:
+        props = {k: v for k, v in r.items() if not k.startswith(":")}
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(r["longitude"]), float(r["latitude"])]},
+            "properties": props,
+        })
+    return json.dumps({"type": "FeatureCollection", "features": features})
+
+
+def make_handler(config: MockConfig):
+    last_modified = formatdate(time.time(), usegmt=True)
+    counters = {"requests": 0}
+    lock = threading.Lock()
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=b"", content_type="application/json", headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with lock:
+                counters["requests"] += 1
+                remaining = max(0, 1000 - counters["requests"] % 1000)
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            rng = random.Random()
+
+            if config.latency_ms or config.latency_jitter_ms:
+                time.sleep(max(0.0, config.latency_ms + rng.uniform(-1, 1) * config.latency_jitter_ms) / 1000)
+            if config.require_token and not self.headers.get("X-App-Token"):
+                return self._send(401, b'{"error": "Authentication required"}')
+            if config.rate_429 and rng.random() < config.rate_429:
+                return self._send(429, b'{"error": "Too Many Requests"}',
+                                  headers={"Retry-After": str(config.retry_after), "X-RateLimit-Remaining": "0"})
+            if config.flaky and rng.random() < config.flaky:
+                return self._send(503, b'{"error": "Service Unavailable"}')
+
+            try:
+                limit = min(int(query.get("$limit", ["1000"])[0]), config.max_limit)
+                offset = int(query.get("$offset", ["0"])[0])
+            except ValueError:
+                return self._send(400, b'{"error": "Bad $limit/$offset"}')
+            records = [make_record(i, config.seed) for i in range(offset, min(config.rows, offset + limit))]
+
+            etag = f'"{config.seed}-{config.rows}-{offset}-{limit}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, headers={"ETag": etag})
+            headers = {
+                "ETag": etag,
+                "Last-Modified": last_modified,
+                "X-RateLimit-Limit": "1000",
+                "X-RateLimit-Remaining": str(remaining),
+            }
+            if parts.path.endswith(".csv"):
+                return self._send(200, to_csv(records).encode("utf-8"), "text/csv", headers)
+            if parts.path.endswith(".geojson"):
+                return self._send(200, to_geojson(records).encode("utf-8"), "application/geo+json", headers)
+            return self._send(200, json.dumps(records).encode("utf-8"), headers=headers)
+
+    MockHandler.counters = counters
+    return MockHandler
+
+
+def start_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start the mock API on a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/resource/mock.json"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic property records for local testing")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--host", default="127.0.0.1")
+    # 8765 is the Phase 3 query service's default; keep them apart so both can run side by side
+    parser.add_argument("--port", type=int, default=8766, help="0 picks a free port")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--flaky", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--require-token", action="store_true", help="401 unless an X-App-Token header is sent")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    config = MockConfig(rows=args.rows, latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                        rate_429=args.rate_429, retry_after=args.retry_after, flaky=args.flaky,
+                        require_token=args.require_token, seed=args.seed)
+    server, url = start_server(config, args.host, args.port)
+    print(f"Serving {args.rows} rows on {url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
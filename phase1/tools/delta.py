@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from tools.fetcher import PaginatedFetcher
+from tools.sink import NDJSONSink, RAW_NDJSON_PATH, ingest_to_sink, iter_ndjson, load_manifest, manifest_path_for
+
+WATERMARK_PATH = os.path.join("data", "state", "watermarks.json")
+
+# Socrata system fields: every row has a stable :id and a server-maintained :updated_at
+DEFAULT_KEY_FIELD = ":id"
+DEFAULT_UPDATED_FIELD = ":updated_at"
+
+_watermark_lock = threading.Lock()
+
+
+def load_watermarks(path: str = WATERMARK_PATH) -> Dict[str, dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_watermark(api_url: str, state: dict, path: str = WATERMARK_PATH):
+    # Endpoints synced concurrently share one file: serialize the read-modify-write
+    with _watermark_lock:
+        watermarks = load_watermarks(path)
+        watermarks[api_url] = state
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(tmp, path)
+
+
+def _select_params(key_field: str, updated_field: str) -> Dict[str, str]:
+    # System fields are hidden unless explicitly selected
+    if key_field.startswith(":") or updated_field.startswith(":"):
+        return {"$select": ":*, *"}
+    return {}
+
+
+def _max_value(records, field: str, current: Optional[str] = None) -> Optional[str]:
+    best = current
+    for record in records:
+        value = record.get(field)
+        if value is not None and (best is None or str(value) > best):
+            best = str(value)
+    return best
+
+
+def _server_max(api_url: str, updated_field: str, **fetch_kwargs) -> Optional[str]:
+    """
+    The endpoint's current max of updated_field, asked for before a pull starts: a row
+    updated while the pull runs then lands at or past the watermark, whatever offset the
+    pull had reached. None if the endpoint cannot answer the aggregate.
+    """
+    params = {"$select": f"max({updated_field}) AS watermark"}
+    fetcher = PaginatedFetcher(api_url, extra_params=params, **dict(fetch_kwargs, page_size=1, order=None))
+    page = fetcher.fetch_page(0)
+    row = page.records[0] if page.ok and page.records else None
+    if isinstance(row, dict) and row.get("watermark") is not None:
+        return str(row["watermark"])
+    return None
+
+
+def _is_deleted(record: dict, deleted_field: Optional[str]) -> bool:
+    if not deleted_field:
+        return False
+    value = record.get(deleted_field)
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "y", "deleted")
+    return bool(value)
+
+
+def merge_into_sink(path: str, upserts: Dict[str, dict], deletes: set, key_field: str,
+                    chunk_size: int = 5000, profiler=None) -> dict:
+    """
+    Rewrite the raw store with changed records replaced in place, new records
+    appended and deleted keys dropped. The rewrite goes to a side file and is
+    swapped in atomically, so a crash mid-merge leaves the old store intact.
+    """
+    previous = load_manifest(path) or {}
+    tmp_path = path + ".merge"
+    sink = NDJSONSink(tmp_path, api_url=previous.get("api_url", ""), page_size=previous.get("page_size", 0))
+    sink.open(resume=False)
+
+    pending = dict(upserts)
+    counts = {"updated": 0, "inserted": 0, "deleted": 0}
+    buffer = []
+    for record in iter_ndjson(path):
+        key = str(record.get(key_field))
+        if key in deletes:
+            counts["deleted"] += 1
+            continue
+        if key in pending:
+            record = pending.pop(key)
+            counts["updated"] += 1
+        buffer.append(record)
+        if len(buffer) >= chunk_size:
+            sink.write_records(buffer)
+            if profiler is not None:
+                profiler.update(buffer)
+            buffer = []
+    buffer.extend(pending.values())
+    counts["inserted"] = len(pending)
+    sink.write_records(buffer)
+    if profiler is not None:
+        profiler.update(buffer)
+    sink.manifest["next_offset"] = sink.manifest["records"]
+    sink.close()
+
+    os.replace(tmp_path, path)
+    os.replace(manifest_path_for(tmp_path), manifest_path_for(path))
+    return counts
+
+
+def sync_endpoint(
+    api_url: str,
+    path: str = RAW_NDJSON_PATH,
+    key_field: str = DEFAULT_KEY_FIELD,
+    updated_field: str = DEFAULT_UPDATED_FIELD,
+    deleted_field: Optional[str] = None,
+    full: bool = False,
+    watermark_path: str = WATERMARK_PATH,
+    profiler=None,
+    **fetch_kwargs,
+) -> dict:
+    """
+    Incrementally sync api_url into the raw store.
+    The first run (or full=True) does a full ingest; later runs fetch only rows
+    whose updated_field is at or past the saved watermark and upsert them by key_field.
+    Deletes are only seen through deleted_field (soft-delete flags): a row removed at
+    the source stays in the store until the next full pull.
+    """
+    extra_params = _select_params(key_field, updated_field)
+    state = load_watermarks(watermark_path).get(api_url)
+    manifest = load_manifest(path)
+    have_store = (
+        state is not None
+        and "last_sync" in state
+        and manifest is not None
+        and manifest.get("complete")
+        and manifest.get("api_url") == api_url
+    )
+
+    if full or not have_store:
+        # A resumed pull keeps the watermark taken when it first started
+        pending = None if full else (state or {}).get("pending_watermark")
+        if pending is None:
+            pending = _server_max(api_url, updated_field, **fetch_kwargs)
+            if pending is not None:
+                save_watermark(api_url, dict(state or {}, pending_watermark=pending), watermark_path)
+        result = ingest_to_sink(api_url, path=path, resume=not full, extra_params=extra_params,
+                                profiler=profiler, **fetch_kwargs)
+        result["mode"] = "full"
+        if not result["failed_pages"]:
+            if pending is None:
+                # No aggregate support: rows updated mid-pull behind the current offset can be missed
+                pending = _max_value(iter_ndjson(path), updated_field)
+            save_watermark(api_url, {
+                "key_field": key_field,
+                "updated_field": updated_field,
+                "watermark": pending,
+                "last_sync": time.time(),
+                "records": result["records_fetched"],
+            }, watermark_path)
+        return result
+
+    watermark = state.get("watermark")
+    params = dict(extra_params)
+    if watermark:
+        # Rows sharing the watermark's timestamp may not all have been seen yet; upserts are idempotent
+        params["$where"] = f"{updated_field} >= '{watermark}'"
+    # Stable ordering so offset paging does not skip or repeat rows
+    params["$order"] = f"{updated_field}, {key_field}"
+
+    upserts: Dict[str, dict] = {}
+    deletes = set()
+    latest = watermark
+    before = _server_max(api_url, updated_field, **fetch_kwargs)
+
+    def on_page(page):
+        nonlocal latest
+        # Tombstones advance the watermark too, otherwise they would be re-fetched forever
+        latest = _max_value(page.records, updated_field, latest)
+        for record in page.records:
+            key = record.get(key_field)
+            if key is None:
+                continue
+            key = str(key)
+            if _is_deleted(record, deleted_field):
+                deletes.add(key)
+                upserts.pop(key, None)
+            else:
+                upserts[key] = record
+                deletes.discard(key)
+
+    fetcher = PaginatedFetcher(api_url, extra_params=params, **fetch_kwargs)
+    failed = fetcher.run(on_page=on_page)
+    failed_pages = [{"offset": p.offset, "status": p.status, "attempts": p.attempts, "error": p.error} for p in failed]
+    result = {
+        "mode": "delta",
+        "output_path": path,
+        "watermark_before": watermark,
+        "changed_records": len(upserts) + len(deletes),
+        "failed_pages": failed_pages,
+        "throughput": fetcher.stats.as_dict(),
+    }
+    if failed:
+        # Keep the old watermark so the next run re-fetches the whole window
+        result["records_fetched"] = manifest.get("records", 0)
+        return result
+
+    if upserts or deletes:
+        # The merge already streams the whole store, so the profile comes for free
+        counts = merge_into_sink(path, upserts, deletes, key_field, profiler=profiler)
+    else:
+        counts = {"updated": 0, "inserted": 0, "deleted": 0}
+    new_watermark = before if before is not None else latest
+    records = (load_manifest(path) or {}).get("records", 0)
+    save_watermark(api_url, {
+        "key_field": key_field,
+        "updated_field": updated_field,
+        "watermark": new_watermark,
+        "last_sync": time.time(),
+        "records": records,
+    }, watermark_path)
+    result.update(counts)
+    result["watermark_after"] = new_watermark
+    result["records_fetched"] = records
+    return result
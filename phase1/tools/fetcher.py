@@ -0,0 +1,364 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+from tools.http_client import get_session
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def build_page_url(api_url: str, limit: int, offset: int, extra_params: Optional[Dict[str, str]] = None) -> str:
+    """Add Socrata-style $limit/$offset params to a URL, keeping any existing query."""
+    parts = urlsplit(api_url)
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ("$limit", "$offset")]
+    params.extend((extra_params or {}).items())
+    params.extend([("$limit", str(limit)), ("$offset", str(offset))])
+    return urlunsplit(parts._replace(query=urlencode(params, safe="$:,'()")))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delay-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def record_key(record) -> str:
+    """Identity of a record for spotting pages served twice: the Socrata row id, else its whole content."""
+    if isinstance(record, dict) and record.get(":id") is not None:
+        return str(record[":id"])
+    return json.dumps(record, sort_keys=True, default=str)
+
+
+@dataclass
+class PageResult:
+    offset: int
+    records: List[dict] = field(default_factory=list)
+    status: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    latency: float = 0.0
+    span: int = 0  # rows this page stands for: the step it was requested at
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class FetchStats:
+    pages_ok: int = 0
+    pages_failed: int = 0
+    records: int = 0
+    retries: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def records_per_sec(self) -> float:
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "pages_ok": self.pages_ok,
+            "pages_failed": self.pages_failed,
+            "records": self.records,
+            "retries": self.retries,
+            "peak_in_flight": self.peak_in_flight,
+            "elapsed_sec": round(self.elapsed, 3),
+            "records_per_sec": round(self.records_per_sec, 1),
+        }
+
+
+class RateLimitGate:
+    """
+    Shared backoff state for all workers.
+    A 429 or an exhausted X-RateLimit-Remaining pauses every worker and halves
+    the allowed concurrency; successful pages grow it back one slot at a time.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def on_throttled(self, retry_after: Optional[float], fallback: float):
+        with self._lock:
+            self.limit = max(1, self.limit // 2)
+        self.pause(retry_after if retry_after is not None else fallback)
+
+    def on_success(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        try:
+            remaining = int(remaining) if remaining is not None else None
+        except ValueError:
+            remaining = None
+        with self._lock:
+            if remaining is not None and remaining < self.limit:
+                self.limit = max(1, remaining)
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+        if remaining == 0:
+            self.pause(parse_retry_after(headers.get("Retry-After")) or 1.0)
+
+
+class PaginatedFetcher:
+    """
+    Fetches a $limit/$offset paginated endpoint to the end of the dataset
+    using a bounded thread pool. Pages are handed to `on_page` in offset order;
+    pages that still fail after retries are reported, never silently dropped.
+
+    The first page sets the step between offsets: a server that caps $limit
+    below page_size returns fewer rows than asked for, and later offsets
+    follow what it actually returns. The data ends at a page shorter than
+    that, or at a page that only repeats rows already seen (an endpoint
+    that ignores $offset would otherwise be paged forever). Pages are
+    requested in a fixed `order` (Socrata's row id by default), since
+    offset paging over an unordered result can skip or repeat rows.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        page_size: int = 1000,
+        max_workers: int = 8,
+        max_retries: int = 5,
+        timeout=(5, 30),
+        backoff_base: float = 0.5,
+        backoff_max: float = 60.0,
+        max_records: Optional[int] = None,
+        extra_params: Optional[Dict[str, str]] = None,
+        session: Optional[requests.Session] = None,
+        progress_every: int = 10,
+        order: Optional[str] = ":id",
+    ):
+        self.api_url = api_url
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_records = max_records
+        self.extra_params = dict(extra_params or {})
+        if order and "$order" not in self.extra_params and "$order" not in dict(parse_qsl(urlsplit(api_url).query)):
+            self.extra_params["$order"] = order
+        self.progress_every = progress_every
+        self.session = session or get_session()
+        self.gate = RateLimitGate(max_workers)
+        self.step = page_size
+        self.stats = FetchStats()
+        self._stats_lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retrying workers from hitting the server in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def fetch_page(self, offset: int) -> PageResult:
+        """Fetch one page, retrying throttled and transient failures."""
+        page = PageResult(offset=offset)
+        url = build_page_url(self.api_url, self.page_size, offset, self.extra_params)
+        for attempt in range(self.max_retries + 1):
+            self.gate.wait()
+            page.attempts = attempt + 1
+            if attempt:
+                with self._stats_lock:
+                    self.stats.retries += 1
+            started = time.monotonic()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                page.latency = time.monotonic() - started
+                page.status = response.status_code
+                if response.status_code == 429:
+                    self.gate.on_throttled(parse_retry_after(response.headers.get("Retry-After")), self._backoff(attempt))
+                    page.error = "429 Too Many Requests"
+                    continue
+                if response.status_code in RETRYABLE_STATUS:
+                    page.error = f"HTTP {response.status_code}"
+                    time.sleep(self._backoff(attempt))
+                    continue
+                response.raise_for_status()
+                data = response.json()
+                page.records = data if isinstance(data, list) else [data]
+                page.error = None
+                self.gate.on_success(response.headers)
+                return page
+            except (requests.ConnectionError, requests.Timeout) as e:
+                page.latency = time.monotonic() - started
+                page.error = f"{type(e).__name__}: {e}"
+                time.sleep(self._backoff(attempt))
+            except Exception as e:
+                # 4xx other than 429 and malformed bodies will not fix themselves
+                page.latency = time.monotonic() - started
+                page.error = f"{type(e).__name__}: {e}"
+                return page
+        return page
+
+    def _run_page(self, offset: int) -> PageResult:
+        with self._stats_lock:
+            self.stats.in_flight += 1
+            self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+        try:
+            page = self.fetch_page(offset)
+            page.span = self.step
+            return page
+        finally:
+            with self._stats_lock:
+                self.stats.in_flight -= 1
+
+    def _report_progress(self):
+        s = self.stats
+        print(
+            f"→ {s.records:,} records | {s.pages_ok} pages ok, {s.pages_failed} failed | "
+            f"{s.records_per_sec:,.1f} rec/s | {s.in_flight} in flight"
+        )
+
+    def run(
+        self,
+        on_page: Optional[Callable[[PageResult], None]] = None,
+        start_offset: int = 0,
+        on_failure: Optional[Callable[[PageResult], None]] = None,
+    ) -> List[PageResult]:
+        """
+        Page until a short or repeated page marks the end of the dataset.
+        Returns the list of failed pages.
+        """
+        self.stats = FetchStats()
+        failed: List[PageResult] = []
+        ready: Dict[int, PageResult] = {}
+        end_offset = None
+        consecutive_failures = 0
+        first_keys, previous_keys = set(), set()
+
+        # The first page alone, to learn how many rows the server really returns per request
+        self.step = self.page_size
+        first = self._run_page(start_offset)
+        if not first.ok:
+            # Without one real response the step is a guess, and a wrong guess under a $limit cap loses rows
+            self.stats.pages_failed += 1
+            if on_failure:
+                on_failure(first)
+            self.stats.finished = time.monotonic()
+            return [first]
+        if 0 < len(first.records) < self.page_size:
+            self.step = len(first.records)
+        next_offset = deliver_offset = start_offset
+
+        def more_to_schedule():
+            if end_offset is not None and next_offset >= end_offset:
+                return False
+            if self.max_records is not None and next_offset - start_offset >= self.max_records:
+                return False
+            # Every page failing (bad auth, dead host) means there is nothing left to find
+            return consecutive_failures < self.max_workers
+
+        def on_done(page: PageResult):
+            nonlocal consecutive_failures, end_offset
+            if page.ok:
+                consecutive_failures = 0
+                # Shorter than what the server has been returning; the first page set the step, so a $limit cap alone is no end
+                if len(page.records) < self.step:
+                    end_offset = min(end_offset or page.offset + self.step, page.offset + self.step)
+            else:
+                consecutive_failures += 1
+                failed.append(page)
+            ready[page.offset] = page
+
+        on_done(first)
+        next_offset += self.step
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+            while True:
+                while more_to_schedule() and len(futures) < self.gate.limit:
+                    futures[pool.submit(self._run_page, next_offset)] = next_offset
+                    next_offset += self.step
+                if not futures and deliver_offset not in ready:
+                    break
+
+                if futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        futures.pop(future)
+                        on_done(future.result())
+
+                # Deliver pages in offset order so sinks can checkpoint a contiguous prefix
+                while deliver_offset in ready:
+                    page = ready.pop(deliver_offset)
+                    deliver_offset += self.step
+                    if end_offset is not None and page.offset >= end_offset:
+                        # Speculative page past the end of the data: neither a record page nor a loss
+                        continue
+                    if page.ok and page.records:
+                        keys = {record_key(r) for r in page.records}
+                        if keys <= (first_keys | previous_keys):
+                            # Nothing new: the endpoint ignores $offset or has wrapped around, so the data ends here
+                            end_offset = min(end_offset or page.offset, page.offset)
+                            continue
+                        first_keys = first_keys or keys
+                        previous_keys = keys
+                    if not page.ok:
+                        with self._stats_lock:
+                            self.stats.pages_failed += 1
+                        if on_failure:
+                            on_failure(page)
+                        continue
+                    with self._stats_lock:
+                        self.stats.pages_ok += 1
+                        self.stats.records += len(page.records)
+                    if on_page and page.records:
+                        on_page(page)
+                    if self.progress_every and self.stats.pages_ok % self.progress_every == 0:
+                        self._report_progress()
+
+        self.stats.finished = time.monotonic()
+        if end_offset is not None:
+            # Pages speculatively requested past the end of the data are not real losses
+            failed = [p for p in failed if p.offset < end_offset]
+        failed.sort(key=lambda p: p.offset)
+        return failed
+
+
+def fetch_all_records(api_url: str, **kwargs) -> dict:
+    """Convenience wrapper that collects every page in memory."""
+    records: List[dict] = []
+    fetcher = PaginatedFetcher(api_url, **kwargs)
+    failed = fetcher.run(on_page=lambda page: records.extend(page.records))
+    return {
+        "records": records,
+        "failed_pages": [{"offset": p.offset, "status": p.status, "attempts": p.attempts, "error": p.error} for p in failed],
+        "stats": fetcher.stats.as_dict(),
+    }
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CACHE_DIR = os.path.join("data", "cache", "http")
+DEFAULT_TTL = 15 * 60            # serve from cache without touching the network
+DEFAULT_MAX_AGE = 24 * 60 * 60   # evict entirely, even if the server would still say 304
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = 16) -> requests.Session:
+    """Process-wide keep-alive session shared by every Phase 1 tool."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    status_code: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+    fetched_at: float = field(default_factory=time.time)
+    from_cache: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.body)
+
+    def header(self, name: str, default=None):
+        # Headers round-trip through JSON on disk, so look them up case-insensitively
+        lowered = name.lower()
+        for k, v in self.headers.items():
+            if k.lower() == lowered:
+                return v
+        return default
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} error for url: {self.url}")
+
+
+class ResponseCache:
+    """
+    Two-tier (memory + disk) cache of GET responses keyed by URL.
+    Fresh entries are served directly; stale ones are revalidated with
+    If-None-Match / If-Modified-Since; entries past max_age are evicted.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, ttl: float = DEFAULT_TTL, max_age: float = DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_age = max_age
+        self._memory: Dict[str, CachedResponse] = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, url: str):
+        base = os.path.join(self.cache_dir, self._key(url))
+        return base + ".meta.json", base + ".body"
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._memory.get(url)
+        if entry is None:
+            meta_path, body_path = self._paths(url)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(body_path, "rb") as f:
+                    body = f.read()
+            except (OSError, ValueError):
+                return None
+            entry = CachedResponse(url=url, status_code=meta["status_code"], headers=meta["headers"],
+                                   body=body, fetched_at=meta["fetched_at"])
+            with self._lock:
+                self._memory[url] = entry
+        if time.time() - entry.fetched_at > self.max_age:
+            self.delete(url)
+            return None
+        return entry
+
+    def put(self, entry: CachedResponse):
+        with self._lock:
+            self._memory[entry.url] = entry
+        meta_path, body_path = self._paths(entry.url)
+        # Write body first so a crash never leaves metadata pointing at a missing body
+        tmp = body_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(entry.body)
+        os.replace(tmp, body_path)
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"url": entry.url, "status_code": entry.status_code,
+                       "headers": entry.headers, "fetched_at": entry.fetched_at}, f)
+        os.replace(tmp, meta_path)
+
+    def delete(self, url: str):
+        with self._lock:
+            self._memory.pop(url, None)
+        for path in self._paths(url):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.fetched_at <= self.ttl
+
+    def evict_expired(self) -> int:
+        """Drop every on-disk entry older than max_age. Returns the number removed."""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".meta.json"):
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - meta.get("fetched_at", 0) > self.max_age:
+                self.delete(meta["url"])
+                removed += 1
+        return removed
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+def cached_get(url: str, timeout=(5, 30), cache: Optional[ResponseCache] = None) -> CachedResponse:
+    """
+    GET through the shared session and response cache.
+    Only successful responses are stored; errors such as 401 are returned but never cached.
+    """
+    cache = cache or get_cache()
+    entry = cache.get(url)
+    if entry is not None and cache.is_fresh(entry):
+        entry.from_cache = True
+        return entry
+
+    headers = {}
+    if entry is not None:
+        if entry.header("ETag"):
+            headers["If-None-Match"] = entry.header("ETag")
+        if entry.header("Last-Modified"):
+            headers["If-Modified-Since"] = entry.header("Last-Modified")
+
+    response = get_session().get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and entry is not None:
+        # Keep the cached body but pick up refreshed headers (e.g. rate-limit counters)
+        entry.headers.update(dict(response.headers))
+        entry.fetched_at = time.time()
+        entry.from_cache = True
+        cache.put(entry)
+        return entry
+
+    fresh = CachedResponse(url=url, status_code=response.status_code,
+                           headers=dict(response.headers), body=response.content)
+    if fresh.ok:
+        cache.put(fresh)
+    return fresh
+
+
+def probe(api_url: str) -> CachedResponse:
+    """Single shared discovery request that every Phase 1 inspection tool analyses."""
+    return cached_get(api_url)
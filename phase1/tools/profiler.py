@@ -0,0 +1,200 @@
+import hashlib
+import math
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Type lattice: a field's type only ever widens, null -> int -> float -> str.
+# bool, nested values and any other mix widen straight to str.
+
+
+def classify(value) -> str:
+    """Infer a lattice type for one JSON value. Numeric strings (common in Socrata feeds) count as numbers."""
+    if value is None or value == "":
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            int(text)
+            return "int"
+        except ValueError:
+            pass
+        try:
+            number = float(text)
+            return "float" if math.isfinite(number) else "str"
+        except ValueError:
+            return "str"
+    # Nested objects/arrays (e.g. Socrata location columns) are opaque text for profiling
+    return "str"
+
+
+def join_types(a: str, b: str) -> str:
+    if a == "null":
+        return b
+    if b == "null" or a == b:
+        return a
+    if {a, b} == {"int", "float"}:
+        return "float"
+    return "str"
+
+
+class HyperLogLog:
+    """Fixed-memory distinct-count sketch (2**p one-byte registers, ~1.04/sqrt(2**p) error)."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        h = int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        for i, r in enumerate(other.registers):
+            if r > self.registers[i]:
+                self.registers[i] = r
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class FieldProfile:
+    def __init__(self):
+        self.present = 0      # records where the key exists
+        self.nulls = 0        # present but null / empty string
+        self.type = "null"
+        self.type_counts: Dict[str, int] = {}
+        self.min = None
+        self.max = None
+        self.distinct = HyperLogLog()
+
+    def update(self, value):
+        self.present += 1
+        kind = classify(value)
+        self.type_counts[kind] = self.type_counts.get(kind, 0) + 1
+        if kind == "null":
+            self.nulls += 1
+            return
+        self.type = join_types(self.type, kind)
+        self.distinct.add(value)
+        numeric = self.type in ("int", "float")
+        key = float(value) if numeric else str(value)
+        if isinstance(self.min, float) and not numeric:
+            # Lattice widened from numeric to text: keep bounds in the wider domain
+            self.min, self.max = str(self.min), str(self.max)
+        if self.min is None or key < self.min:
+            self.min = key
+        if self.max is None or key > self.max:
+            self.max = key
+
+    def to_dict(self, total: int) -> dict:
+        missing = total - (self.present - self.nulls)
+        return {
+            "type": self.type,
+            "type_counts": dict(self.type_counts),
+            "present": self.present,
+            "nulls": self.nulls,
+            "missing_pct": round(missing / total * 100, 2) if total else 0.0,
+            "distinct_estimate": self.distinct.count(),
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class StreamingProfiler:
+    """
+    Single-pass, bounded-memory profile of a record stream.
+    Feed it pages as they arrive; fields first seen in later pages are tracked
+    too, and count as missing for every record before them.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.fields: Dict[str, FieldProfile] = {}
+
+    def update(self, records: Iterable[dict]):
+        for record in records:
+            self.total += 1
+            if not isinstance(record, dict):
+                continue
+            for key, value in record.items():
+                profile = self.fields.get(key)
+                if profile is None:
+                    profile = self.fields[key] = FieldProfile()
+                profile.update(value)
+
+    def on_page(self, page):
+        """Callback for PaginatedFetcher.run."""
+        self.update(page.records)
+
+    def schema(self) -> Dict[str, str]:
+        return {k: p.type for k, p in self.fields.items()}
+
+    def missing_report(self) -> Dict[str, float]:
+        if not self.total:
+            return {}
+        return {
+            k: round((self.total - (p.present - p.nulls)) / self.total * 100, 2)
+            for k, p in self.fields.items()
+        }
+
+    def to_dict(self) -> dict:
+        return {"records": self.total, "fields": {k: p.to_dict(self.total) for k, p in self.fields.items()}}
+
+
+class ProfilerWorker:
+    """
+    Runs a StreamingProfiler on its own thread. Hashing every value costs more than
+    parsing a page, and on the fetcher's delivery thread it would hold up scheduling
+    the next requests. The queue is bounded, so if profiling falls `max_pending` pages
+    behind, update() waits instead of buffering the dataset. Call close() to drain.
+    """
+
+    def __init__(self, profiler: StreamingProfiler, max_pending: int = 64):
+        self.profiler = profiler
+        self._queue: "queue.Queue[Optional[List[dict]]]" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            records = self._queue.get()
+            if records is None:
+                return
+            if self._error is None:
+                try:
+                    self.profiler.update(records)
+                except Exception as e:  # surfaced by close(), on the caller's thread
+                    self._error = e
+
+    def update(self, records: List[dict]):
+        self._queue.put(records)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def profile_records(records: Iterable[dict], profiler: Optional[StreamingProfiler] = None) -> StreamingProfiler:
+    profiler = profiler or StreamingProfiler()
+    profiler.update(records)
+    return profiler
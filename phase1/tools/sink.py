@@ -0,0 +1,239 @@
+import json
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+RAW_NDJSON_PATH = os.path.join("data", "raw", "raw_input.ndjson")
+
+
+def manifest_path_for(path: str) -> str:
+    return path + ".manifest.json"
+
+
+def partial_path_for(path: str) -> str:
+    return path + ".partial"
+
+
+def load_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(manifest_path_for(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class NDJSONSink:
+    """
+    Append-only NDJSON writer for raw records.
+    Every page is flushed to disk before the manifest is updated, so the
+    manifest's byte length and next_offset always describe a durable prefix
+    that an interrupted ingest can resume from. A refresh over a complete store
+    is written to a side file and only swapped in once it is complete itself.
+    """
+
+    def __init__(self, path: str = RAW_NDJSON_PATH, api_url: str = "", page_size: int = 0):
+        self.target = path
+        self.path = path
+        self.api_url = api_url
+        self.page_size = page_size
+        self.manifest = None
+        self._fh = None
+
+    @property
+    def manifest_path(self) -> str:
+        return manifest_path_for(self.path)
+
+    def _resumable(self, path: str) -> Optional[dict]:
+        previous = load_manifest(path)
+        if (
+            previous is not None
+            and not previous.get("complete")
+            and previous.get("api_url") == self.api_url
+            and previous.get("page_size") == self.page_size
+            and os.path.exists(path)
+            # Older manifests kept bare offsets, which cannot say how many rows a failed page covered
+            and "failed_spans" in previous
+        ):
+            return previous
+        return None
+
+    def open(self, resume: bool = True) -> int:
+        """Open the sink and return the offset to resume fetching from."""
+        os.makedirs(os.path.dirname(self.target) or ".", exist_ok=True)
+        partial = partial_path_for(self.target)
+        previous = None
+        if resume:
+            for candidate in (partial, self.target):
+                previous = self._resumable(candidate)
+                if previous is not None:
+                    self.path = candidate
+                    break
+        if previous is not None:
+            self.manifest = previous
+            self._fh = open(self.path, "r+b")
+            # Anything after the last committed byte is a torn write from the crash
+            self._fh.truncate(previous["bytes"])
+            self._fh.seek(previous["bytes"])
+        else:
+            self.manifest = {
+                "api_url": self.api_url,
+                "page_size": self.page_size,
+                "format": "ndjson",
+                "next_offset": 0,
+                "records": 0,
+                "bytes": 0,
+                "failed_spans": [],
+                "complete": False,
+            }
+            current = load_manifest(self.target)
+            # Never truncate a complete store before its replacement has arrived
+            self.path = partial if current is not None and current.get("complete") else self.target
+            self._fh = open(self.path, "wb")
+        self._commit()
+        return self.manifest["next_offset"]
+
+    @property
+    def failed_spans(self) -> List[Tuple[int, int]]:
+        """(offset, rows) ranges lost after retries; a failed page may stand for more than one server page."""
+        return [(o, n) for o, n in self.manifest.get("failed_spans", [])]
+
+    def write_records(self, records: List[dict], next_offset: Optional[int] = None):
+        if records:
+            payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+            self._fh.write(payload)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self.manifest["records"] += len(records)
+            self.manifest["bytes"] += len(payload)
+        if next_offset is not None:
+            self.manifest["next_offset"] = max(self.manifest["next_offset"], next_offset)
+        self._commit()
+
+    def write_page(self, page):
+        """Callback for PaginatedFetcher.run: commit one page and advance the checkpoint."""
+        self.write_records(page.records, next_offset=page.offset + len(page.records))
+
+    def add_failed(self, page):
+        """Callback for PaginatedFetcher.run: remember a lost page so a resume can retry it."""
+        self.mark_failed(self.failed_spans + [(page.offset, page.span or self.page_size)])
+
+    def mark_failed(self, spans: List[Tuple[int, int]]):
+        widest = {}
+        for offset, span in spans:
+            widest[offset] = max(span, widest.get(offset, 0))
+        self.manifest["failed_spans"] = [[o, widest[o]] for o in sorted(widest)]
+        self._commit()
+
+    def close(self, complete: bool = True):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self.manifest["complete"] = complete and not self.manifest["failed_spans"]
+        self._commit()
+        if self.manifest["complete"] and self.path != self.target:
+            os.replace(self.path, self.target)
+            os.replace(self.manifest_path, manifest_path_for(self.target))
+            self.path = self.target
+
+    def _commit(self):
+        self.manifest["updated_at"] = time.time()
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+
+def iter_ndjson(path: str = RAW_NDJSON_PATH) -> Iterator[dict]:
+    """Lazily yield records from the committed prefix of an NDJSON sink."""
+    manifest = load_manifest(path)
+    limit = manifest["bytes"] if manifest else None
+    read = 0
+    with open(path, "rb") as f:
+        for line in f:
+            read += len(line)
+            if limit is not None and read > limit:
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _refetch_span(fetcher, sink: NDJSONSink, offset: int, span: int, profiler=None) -> Optional[object]:
+    """
+    Fetch the rows [offset, offset + span) page by page; the server may return
+    fewer rows per request than the span. Returns the failed page, with its
+    span narrowed to what is still missing, or None once the span is covered.
+    """
+    end = offset + span
+    while offset < end:
+        page = fetcher.fetch_page(offset)
+        if not page.ok:
+            page.span = end - offset
+            return page
+        records = page.records[:end - offset]
+        sink.write_records(records)
+        if profiler is not None:
+            profiler.update(records)
+        if not records:
+            break
+        offset += len(records)
+    return None
+
+
+def ingest_to_sink(api_url: str, path: str = RAW_NDJSON_PATH, resume: bool = True, profiler=None, **fetch_kwargs) -> dict:
+    """
+    Stream every page of api_url into an NDJSON sink, resuming from the
+    manifest checkpoint (and retrying previously failed pages) when possible.
+    If a StreamingProfiler is given it sees every record as it is written,
+    on a worker thread so profiling never stalls page delivery.
+    """
+    from tools.fetcher import PaginatedFetcher
+    from tools.profiler import ProfilerWorker
+
+    fetcher = PaginatedFetcher(api_url, **fetch_kwargs)
+    sink = NDJSONSink(path, api_url=api_url, page_size=fetcher.page_size)
+    start_offset = sink.open(resume=resume)
+    if profiler is not None and sink.manifest["records"]:
+        # Records committed by the interrupted run are profiled from disk, not re-fetched
+        profiler.update(iter_ndjson(sink.path))
+    worker = ProfilerWorker(profiler) if profiler is not None else None
+
+    sample = {}
+
+    def on_page(page):
+        nonlocal sample
+        if not sample and page.records:
+            sample = page.records[0]
+        sink.write_page(page)
+        if worker is not None:
+            worker.update(page.records)
+
+    try:
+        # Failed pages at or past the checkpoint are fetched again by the run below anyway
+        retry = [(o, n) for o, n in sink.failed_spans if o < start_offset]
+        sink.mark_failed(retry)
+        still_failed = []
+        for offset, span in retry:
+            page = _refetch_span(fetcher, sink, offset, span, worker)
+            # Only the part that is still missing stays on the manifest
+            remaining = [s for s in sink.failed_spans if s[0] != offset]
+            if page is not None:
+                still_failed.append(page)
+                remaining.append((page.offset, page.span))
+            sink.mark_failed(remaining)
+
+        failed = fetcher.run(on_page=on_page, start_offset=start_offset, on_failure=sink.add_failed) + still_failed
+    finally:
+        if worker is not None:
+            worker.close()
+    sink.mark_failed([(p.offset, p.span or sink.page_size) for p in failed])
+    sink.close()
+    return {
+        "records_fetched": sink.manifest["records"],
+        "sample_record": sample,
+        "output_path": sink.path,
+        "resumed_from_offset": start_offset,
+        "failed_pages": [{"offset": p.offset, "span": p.span, "status": p.status, "attempts": p.attempts, "error": p.error}
+                         for p in failed],
+        "throughput": fetcher.stats.as_dict(),
+    }
@@ -1,18 +1,21 @@
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-from typing import Dict
-import requests
-import time
-import json
+from typing import Dict, Optional
 from dotenv import load_dotenv
+from tools.fetcher import fetch_all_records
+from tools.http_client import probe
+from tools.sink import ingest_to_sink
+from tools.profiler import StreamingProfiler, profile_records
+from common.field_mapping import get_mapper, llm_map_fields
 
 load_dotenv()
 
-# === Field Variation Mapper Tool (LLM-based) ===
+# === Field Variation Mapper Tool ===
 @tool
 def field_variation_mapper_tool(input: Dict) -> Dict[str, str]:
     """
-    Map raw field names to standardized names using the LLM.
+    Map raw field names to standardized names.
+    Resolved locally (synonyms, normalized tokens, fuzzy match, confirmed mappings);
+    only fields the local engine does not know are sent to the LLM, in one call.
     Expects input: { "fields": ["sqft", "zip", "sale_price"] }
     Returns a dictionary: { "sqft": "square_feet", ... }
     """
@@ -20,40 +23,26 @@ def field_variation_mapper_tool(input: Dict) -> Dict[str, str]:
         fields = input.get("fields")
         if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
             raise ValueError("Input must be a dict with a 'fields' key containing a list of strings.")
-
-        llm = ChatOpenAI(model="gpt-4.1", temperature=0)
-        prompt = (
-            "You are a data analyst assistant. Given a list of raw API field names, map each one to its most likely standardized version.\n\n"
-            f"Raw fields: {fields}\n\n"
-            "Return ONLY a JSON dictionary where the keys are the original fields and values are the standardized names."
-        )
-
-        response = llm.invoke(prompt)
-
-        try:
-            result = json.loads(response)
-            if isinstance(result, dict):
-                return result
-            else:
-                return {"error": "Expected dictionary output from LLM.", "raw_output": response}
-        except json.JSONDecodeError:
-            return {"error": "Failed to parse LLM response as JSON.", "raw_output": response}
-
+        return get_mapper().map_fields(fields, llm_fallback=llm_map_fields)
     except Exception as e:
         return {"error": str(e)}
 
 
+def _profile_probe(api_url: str) -> StreamingProfiler:
+    """Profile every record in the shared probe response (not just the first one)."""
+    response = probe(api_url)
+    response.raise_for_status()
+    data = response.json()
+    return profile_records(data if isinstance(data, list) else [data])
+
+
 # === Inspect API Schema Tool ===
 @tool
 def inspect_api_schema_tool(api_url: str) -> Dict[str, str]:
     """Inspect an API endpoint and return field names with inferred data types."""
     try:
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        sample = data[0] if isinstance(data, list) and data else data
-        schema = {k: type(v).__name__ for k, v in sample.items()}
-        return schema
+        profiler = _profile_probe(api_url)
+        return profiler.schema()
     except Exception as e:
         return {"error": str(e)}
 
@@ -63,7 +52,7 @@ def inspect_api_schema_tool(api_url: str) -> Dict[str, str]:
 def auth_requirement_checker_tool(api_url: str) -> str:
     """Check if the API endpoint requires authentication."""
     try:
-        r = requests.get(api_url, timeout=10)
+        r = probe(api_url)
         if r.status_code == 401:
             return "Authentication required (401)"
         return "No authentication required"
@@ -76,11 +65,11 @@ def auth_requirement_checker_tool(api_url: str) -> str:
 def rate_limit_detector_tool(api_url: str) -> Dict[str, str]:
     """Detect if the API provides rate-limiting information in headers."""
     try:
-        r = requests.get(api_url, timeout=10)
+        r = probe(api_url)
         return {
-            "X-RateLimit-Limit": r.headers.get("X-RateLimit-Limit", "N/A"),
-            "X-RateLimit-Remaining": r.headers.get("X-RateLimit-Remaining", "N/A"),
-            "Retry-After": r.headers.get("Retry-After", "N/A"),
+            "X-RateLimit-Limit": r.header("X-RateLimit-Limit", "N/A"),
+            "X-RateLimit-Remaining": r.header("X-RateLimit-Remaining", "N/A"),
+            "Retry-After": r.header("Retry-After", "N/A"),
         }
     except Exception as e:
         return {"error": str(e)}
@@ -91,47 +80,48 @@ def rate_limit_detector_tool(api_url: str) -> Dict[str, str]:
 def missing_data_detector_tool(api_url: str) -> Dict[str, float]:
     """Detect percentage of missing fields in the API response."""
     try:
-        r = requests.get(api_url, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-        sample_data = data if isinstance(data, list) else [data]
-        if not sample_data:
+        profiler = _profile_probe(api_url)
+        if not profiler.total:
             return {"error": "No data available."}
-        total = len(sample_data)
-        keys = sample_data[0].keys()
-        return {
-            key: round(sum(1 for row in sample_data if not row.get(key)) / total * 100, 2)
-            for key in keys
-        }
+        return profiler.missing_report()
     except Exception as e:
         return {"error": str(e)}
 
 
 # === Batching and Retry Tool ===
 @tool
-def batching_and_retry_tool(api_url: str) -> dict:
+def batching_and_retry_tool(
+    api_url: str,
+    page_size: int = 1000,
+    max_workers: int = 8,
+    max_records: Optional[int] = None,
+    output_path: Optional[str] = None,
+    resume: bool = True,
+) -> dict:
     """
-    Simulate paginated fetching (3 pages of 100) and retry on rate limit errors.
-    Returns all records, a sample record, and metadata.
+    Fetch the full dataset with concurrent $limit/$offset paging.
+    Honors Retry-After / X-RateLimit-Remaining with adaptive backoff and
+    returns the pages that failed after retries and throughput stats.
+    With output_path, pages are streamed to a resumable NDJSON sink instead
+    of being returned in memory. Every page is profiled as it arrives.
     """
-    results = []
-    for i in range(1, 4):  # Simulate 3 pages
-        try:
-            paged_url = f"{api_url}?$limit=100&$offset={(i - 1) * 100}"
-            response = requests.get(paged_url, timeout=10)
-            if response.status_code == 429:
-                time.sleep(1)
-                response = requests.get(paged_url)
-            response.raise_for_status()
-            data = response.json()
-            results.extend(data if isinstance(data, list) else [data])
-        except Exception as e:
-            continue
-
+    profiler = StreamingProfiler()
+    if output_path:
+        result = ingest_to_sink(api_url, path=output_path, resume=resume, profiler=profiler,
+                                page_size=page_size, max_workers=max_workers, max_records=max_records)
+        result["profile"] = profiler.to_dict()
+        return result
+
+    result = fetch_all_records(api_url, page_size=page_size, max_workers=max_workers, max_records=max_records)
+    records = result["records"]
+    profiler.update(records)
     return {
-        "records_fetched": len(results),
-        "records": results,  # include all fetched records
-        "sample_record": results[0] if results else {},
+        "records_fetched": len(records),
+        "records": records,  # include all fetched records
+        "sample_record": records[0] if records else {},
+        "failed_pages": result["failed_pages"],
+        "throughput": result["stats"],
+        "profile": profiler.to_dict(),
     }
 
 # === Markdown Documentation Generator ===
@@ -1,7 +1,9 @@
 import os
 import json
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 from langchain.agents import Tool, AgentExecutor, create_openai_functions_agent
@@ -11,101 +13,321 @@ from tools.tools import (
     detect_outliers,
     log_errors_tool,
     filter_industrial_zoning,
+    set_outlier_bounds,
+    get_outlier_bounds,
 )
 from tools.utils import fetch_data
+from tools.engine import CleaningEngine, industrial_mask, resolve_roles
+from tools.frames import get_registry, is_handle
+from tools.quantiles import build_sketches
+from tools.scheduler import BatchScheduler, TokenBucket
+from tools.checkpoint import SPOOL_DIR, BatchSpool
+from tools.output import ProcessedWriter
+from tools.validation import RuleSet
+from tools.zoning import get_zoning_matcher
+from common.events import get_event_log
+from common.llm_cache import get_llm_cache
+from common.streaming import default_output_format, iter_frames, output_path
 
 # Load environment variables
 load_dotenv()
 
-# === Compute Absolute Path to raw_input.json from Phase 1 ===
+# === Compute Absolute Path to Phase 1 raw output ===
 script_dir = os.path.dirname(os.path.abspath(__file__))
-RAW_DATA_PATH = os.path.normpath(os.path.join(script_dir, "..", "phase1", "data", "raw", "raw_input.json"))
+RAW_DIR = os.path.normpath(os.path.join(script_dir, "..", "phase1", "data", "raw"))
+RAW_NDJSON_PATH = os.path.join(RAW_DIR, "raw_input.ndjson")
+RAW_DATA_PATH = os.path.join(RAW_DIR, "raw_input.json")  # legacy single-array output
 
-if not os.path.exists(RAW_DATA_PATH):
+parser = argparse.ArgumentParser(description="Clean Phase 1 raw property data")
+parser.add_argument("--input", help="Raw data file (JSON array, NDJSON, GeoJSON or CSV); defaults to Phase 1 output")
+parser.add_argument("--engine", choices=["vectorized", "agent"], default="vectorized",
+                    help="vectorized: deterministic whole-frame clean; agent: every batch through the LLM agent")
+parser.add_argument("--agent-anomalies", action="store_true",
+                    help="Send rows the vectorized engine cannot judge to the LLM agent")
+parser.add_argument("--offline", action="store_true", help="Never call the LLM to resolve column roles")
+parser.add_argument("--rules", help="JSON validation rule set (defaults to tools.validation.DEFAULT_RULES)")
+parser.add_argument("--jurisdiction", default=os.getenv("ZONING_JURISDICTION", "default"),
+                    help="Industrial zoning pattern set from config/zoning.json")
+parser.add_argument("--jurisdiction-column", help="Column naming each row's jurisdiction, for mixed datasets")
+parser.add_argument("--batch-size", type=int, default=50, help="Rows per LLM agent batch")
+parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per chunk for the vectorized engine")
+parser.add_argument("--workers", type=int, default=1, help="Threads sketching chunks in the outlier pre-pass")
+parser.add_argument("--concurrency", type=int, default=4, help="Agent batches in flight at once")
+parser.add_argument("--rpm", type=float, default=60.0,
+                    help="OpenAI chat requests allowed per minute across all agent batches, every tool-loop step counted (token bucket)")
+parser.add_argument("--max-retries", type=int, default=3, help="Retries per agent batch on transient API errors")
+parser.add_argument("--spool-dir", default=SPOOL_DIR, help="Where finished agent batches are checkpointed")
+parser.add_argument("--fresh", action="store_true", help="Ignore checkpointed batches and reprocess everything")
+parser.add_argument("--output-format", choices=["parquet", "csv"], default=default_output_format(),
+                    help="Processed output format (parquet needs pyarrow)")
+parser.add_argument("--output", help="Processed output path (defaults to data/processed/processed_data.*)")
+parser.add_argument("--partition-by", nargs="+",
+                    help="Partition Parquet output by these columns or roles (e.g. zoning, or a jurisdiction column)")
+args = parser.parse_args()
+
+if not args.input and not os.path.exists(RAW_NDJSON_PATH) and not os.path.exists(RAW_DATA_PATH):
     print(" Raw input file not found.")
     exit(1)
 
-# === Load Raw Dataset ===
-with open(RAW_DATA_PATH, "r", encoding="utf-8") as f:
-    raw_data_str = f.read()
-df = pd.read_json(raw_data_str)
-
-# === LLM and Tool Setup ===
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+batch_size = args.batch_size
+os.environ["ZONING_JURISDICTION"] = args.jurisdiction  # picked up by the agent tools' matcher
 
-tools = [
-    Tool.from_function(validate_required_fields, name="ValidateRequiredFields", description="Validates required fields"),
-    Tool.from_function(detect_outliers, name="DetectOutliers", description="Removes numerical outliers"),
-    Tool.from_function(filter_industrial_zoning, name="FilterIndustrialZoning", description="Filters for industrial zoning"),
-    Tool.from_function(log_errors_tool, name="LogErrors", description="Logs errors with context"),
-]
+# === Load Raw Dataset ===
+# Streamed in bounded chunks whatever the format (NDJSON sink, JSON array, GeoJSON, CSV)
+RAW_PATH = args.input or (RAW_NDJSON_PATH if os.path.exists(RAW_NDJSON_PATH) else RAW_DATA_PATH)
 
-prompt = ChatPromptTemplate.from_messages([
-    ("system", "You are a data cleaning assistant. Use the tools to clean property records step-by-step."),
-    ("user", "{input}"),
-    MessagesPlaceholder(variable_name="agent_scratchpad"),
-])
 
-agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, prompt=prompt, verbose=True)
+def load_batches(size):
+    """Fresh iterator over the raw data, `size` rows at a time, without loading the whole file."""
+    return iter_frames(RAW_PATH, chunk_size=size)
 
 # === Create Output Folders ===
 os.makedirs("data/processed", exist_ok=True)
 os.makedirs("data/logs", exist_ok=True)
 
-# === Batch Processing ===
-batch_size = 50
-results = []
 
-for i, batch in enumerate(fetch_data(df, batch_size=batch_size), start=1):
-    try:
-        print(f"\n Processing batch {i}...")
-        input_json = batch.to_dict(orient="records")
-
-        instruction = (
-            "Please clean this batch:\n"
-            "1. Filter for industrial zoning properties\n"
-            "2. Validate required fields\n"
-            "3. Remove outliers\n"
-            "Return clean JSON records."
-        )
-
-        result = agent_executor.invoke({"input": instruction + "\n" + json.dumps(input_json)})
-        output = result.get("output")
-
-        # ---  output handling ---
-        if not output or not isinstance(output, str) or not output.strip().startswith("["):
-            log_errors_tool.invoke(json.dumps({
-                "batch": i,
-                "llm_response": output,
-                "error": "Output not valid JSON array"
-            }))
-            continue
+class RequestRateLimit(BaseCallbackHandler):
+    """Takes a token before every chat request, so --rpm holds however many tool-loop steps an invocation makes."""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.bucket.acquire()
+
+
+def build_agent_executor():
+    """LLM agent for batches the deterministic engine cannot handle (built only when needed)."""
+    callbacks = [RequestRateLimit(TokenBucket(args.rpm))] if args.rpm else None
+    llm = ChatOpenAI(model=AGENT_MODEL, temperature=0, callbacks=callbacks)
 
+    tools = [
+        Tool.from_function(validate_required_fields, name="ValidateRequiredFields", description="Validates required fields; takes and returns a frame handle"),
+        Tool.from_function(detect_outliers, name="DetectOutliers", description="Removes numerical outliers; takes and returns a frame handle"),
+        Tool.from_function(filter_industrial_zoning, name="FilterIndustrialZoning", description="Filters for industrial zoning; takes and returns a frame handle"),
+        Tool.from_function(log_errors_tool, name="LogErrors", description="Logs errors with context"),
+    ]
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a data cleaning assistant. Use the tools to clean property records step-by-step."),
+        ("user", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+
+    agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
+    return AgentExecutor(agent=agent, tools=tools, prompt=prompt, verbose=True)
+
+
+AGENT_MODEL = "gpt-4.1"
+AGENT_INSTRUCTION = (
+    "Please clean the batch registered as {handle} ({rows} rows).\n"
+    "Pass the handle to each tool; every tool returns a new handle.\n"
+    "1. Filter for industrial zoning properties\n"
+    "2. Validate required fields\n"
+    "3. Remove outliers\n"
+    "Reply with only the final handle."
+)
+
+
+def run_agent_batches(batches, stage="agent"):
+    """
+    Send batches through the LLM agent concurrently (see tools.scheduler).
+    Every finished batch is checkpointed to the spool, so a rerun only pays for
+    batches that failed or changed. Returns the cleaned DataFrames in batch order.
+    """
+    agent_executor = build_agent_executor()
+    registry = get_registry()
+    results = []
+    spool = BatchSpool({
+        "stage": stage,
+        "model": AGENT_MODEL,
+        "instruction": AGENT_INSTRUCTION,
+        "jurisdiction": args.jurisdiction,
+        "rules": RuleSet.load(args.rules).rules,
+        # The fences themselves are approximate (KLL) and shift with chunk/worker order, so only
+        # how they are fit is part of the key; a rerun over unchanged batches then skips them all
+        "outliers": "global IQR, 1.5 whisker" if get_outlier_bounds() is not None else "per batch",
+    }, spool_dir=args.spool_dir)
+    keys = {}
+
+    def lookup(i, batch):
+        keys[i] = spool.key(batch)
+        return None if args.fresh else spool.load(keys[i])
+
+    def clean_batch(i, batch):
+        print(f"\n Processing batch {i}...")
+        # Tools exchange registry handles; the LLM only reads a short preview of the rows
+        handle = registry.put(batch.reset_index(drop=True))
         try:
-            output_data = json.loads(output)
-        except Exception as e:
-            log_errors_tool.invoke(json.dumps({
-                "batch": i,
-                "llm_response": output,
-                "error": f"JSON decode failed: {str(e)}"
-            }))
-            continue
-        # --- output handling ---
-
-        clean_batch = pd.DataFrame(output_data)
-        results.append(clean_batch)
-
-    except Exception as e:
-        error_msg = json.dumps({"batch": i, "error": str(e)})
-        log_errors_tool.invoke(error_msg)
-        continue
+            preview = registry.to_json(handle, limit=5)
+
+            instruction = AGENT_INSTRUCTION.format(handle=handle, rows=len(batch))
+
+            # API errors propagate so the scheduler can retry them
+            result = agent_executor.invoke({"input": instruction + "\nSample rows: " + preview})
+            output = result.get("output")
+
+            if is_handle(output):
+                cleaned = registry.get(output)
+                spool.save(keys[i], i, cleaned)
+                return cleaned
+
+            # ---  output handling ---
+            if not output or not isinstance(output, str) or not output.strip().startswith("["):
+                log_errors_tool.invoke(json.dumps({
+                    "stage": stage,
+                    "batch": i,
+                    "llm_response": output,
+                    "error_class": "InvalidOutput",
+                    "error": "Output not valid JSON array"
+                }))
+                spool.mark_failed(keys[i], i, "Output not valid JSON array")
+                return None
+
+            try:
+                output_data = json.loads(output)
+            except Exception as e:
+                log_errors_tool.invoke(json.dumps({
+                    "stage": stage,
+                    "batch": i,
+                    "llm_response": output,
+                    "error_class": type(e).__name__,
+                    "error": f"JSON decode failed: {str(e)}"
+                }))
+                spool.mark_failed(keys[i], i, f"JSON decode failed: {str(e)}")
+                return None
+            # --- output handling ---
+
+            cleaned = pd.DataFrame(output_data)
+            spool.save(keys[i], i, cleaned)
+            return cleaned
+
+        finally:
+            registry.release(handle)
+
+    def on_result(result):
+        if not result.ok:
+            spool.mark_failed(keys[result.index], result.index, result.error)
+            log_errors_tool.invoke(json.dumps({"stage": stage, "batch": result.index, "attempts": result.attempts,
+                                               "error": result.error, "duration": result.latency}))
+        else:
+            events.log(stage, "batch done", batch=result.index, duration=result.latency, attempts=result.attempts)
+            if result.value is not None:
+                results.append(result.value)
+
+    scheduler = BatchScheduler(
+        clean_batch,
+        concurrency=args.concurrency,
+        requests_per_minute=None,  # the LLM's RequestRateLimit callback meters every request instead
+        max_retries=args.max_retries,
+        lookup=lookup,
+    )
+    scheduler.run(batches, on_result=on_result)
+    print(f" Agent batches: {scheduler.stats.as_dict()}")
+    print(f" Checkpoint spool ({spool.spool_dir}): {spool.summary()}")
+    return results
+
+
+# === Cleaning ===
+def open_writer(roles):
+    """Processed output; zoning/property type are dictionary-encoded and --partition-by accepts roles or columns."""
+    partition_cols = [roles.get(c) or c for c in args.partition_by] if args.partition_by else None
+    path = args.output or output_path(args.output_format, partitioned=bool(partition_cols))
+    return ProcessedWriter(path, args.output_format,
+                           dictionary_columns=[roles.get("zoning"), roles.get("property_type")],
+                           partition_cols=partition_cols)
+
+
+events = get_event_log()
+results = []
+first_chunk = next(iter(load_batches(args.chunk_size)), None)
+
+if args.engine == "agent":
+    # Pre-pass: dataset-wide outlier fences so every agent batch is judged against the same bounds,
+    # sketched over the same industrial, valid rows the deterministic path fits them on
+    zoning = get_zoning_matcher(args.jurisdiction)
+    engine = None
+    if first_chunk is not None:
+        engine = CleaningEngine.from_frame(first_chunk, use_llm=False, rules=RuleSet.load(args.rules), zoning=zoning,
+                                           jurisdiction_column=args.jurisdiction_column)
+    if engine is not None:
+        roles = engine.roles
+        bounds = engine.fit_bounds(load_batches(args.chunk_size), workers=args.workers)
+    else:
+        roles = resolve_roles(first_chunk, use_llm=False) if first_chunk is not None else {}
+        zoning_col = roles.get("zoning")
+
+        def industrial_rows(chunk):
+            # Without every role only the zoning filter can be replayed; still better than raw rows
+            if zoning_col not in chunk.columns:
+                return chunk
+            jurisdiction = chunk[args.jurisdiction_column] if args.jurisdiction_column in chunk.columns else None
+            return chunk[industrial_mask(chunk[zoning_col], zoning, jurisdiction)]
+
+        bounds = build_sketches(load_batches(args.chunk_size), workers=args.workers,
+                                transform=industrial_rows).iqr_bounds()
+    set_outlier_bounds(bounds)
+    results = run_agent_batches(load_batches(batch_size))
+    writer = open_writer(roles)
+else:
+    # Deterministic path: resolve column roles once from the first chunk, then two passes:
+    # 1. sketch every numeric column across all chunks for global IQR fences
+    # 2. clean each chunk vectorized against those fences, streaming it straight to the output
+    rules = RuleSet.load(args.rules)
+    engine = None
+    if first_chunk is not None:
+        engine = CleaningEngine.from_frame(first_chunk, use_llm=not args.offline, rules=rules,
+                                           zoning=get_zoning_matcher(args.jurisdiction),
+                                           jurisdiction_column=args.jurisdiction_column)
+    if engine is None:
+        print(" Could not resolve zoning/property type/square footage columns; falling back to the agent.")
+        results = run_agent_batches(load_batches(batch_size))
+        writer = open_writer({})
+    else:
+        print(f" Column roles: {engine.roles}")
+        with events.timed("fit_bounds"):
+            bounds = engine.fit_bounds(load_batches(args.chunk_size), workers=args.workers)
+        print(f" Global outlier bounds: {bounds}")
+
+        writer = open_writer(engine.roles)
+        totals = {}
+        anomalies = []
+        for n, chunk in enumerate(load_batches(args.chunk_size), start=1):
+            with events.timed("vectorized_clean", batch=n, rows=len(chunk)):
+                clean_chunk, chunk_anomalies, stats = engine.clean(chunk, bounds=bounds)
+            writer.write(clean_chunk)
+            if len(chunk_anomalies):
+                anomalies.append(chunk_anomalies)
+            for step, count in stats.items():
+                if isinstance(count, dict):
+                    rule_totals = totals.setdefault(step, {})
+                    for rule, n in count.items():
+                        rule_totals[rule] = rule_totals.get(rule, 0) + n
+                else:
+                    totals[step] = totals.get(step, 0) + count
+        rule_failures = totals.pop("rule_failures", {})
+        print(f" Vectorized clean: {totals}")
+        print(f" Validation failures by rule: {rule_failures}")
+
+        if anomalies:
+            anomalies = pd.concat(anomalies, ignore_index=True)
+            if args.agent_anomalies:
+                results.extend(run_agent_batches(fetch_data(anomalies, batch_size=batch_size), stage="anomalies"))
+            else:
+                log_errors_tool.invoke(json.dumps({
+                    "stage": "vectorized_clean",
+                    "error_class": "ReviewRowsSkipped",
+                    "error": f"{len(anomalies)} rows flagged for review (e.g. unparseable square footage) skipped",
+                }))
 
 # === Save Final Cleaned Dataset ===
-if results:
-    final_df = pd.concat(results, ignore_index=True)
-    output_path = "data/processed/processed_data.csv"
-    final_df.to_csv(output_path, index=False)
-    print(f"\n Cleaned data saved to '{output_path}'")
+for result in results:
+    writer.write(result)
+summary = writer.close()
+if summary["rows"]:
+    print(f"\n Cleaned data saved to '{summary['path']}' ({summary['rows']} rows, {summary['format']})")
 else:
     print("\n No valid batches were processed.")
+events.flush()
+print(f" Events by stage (data/logs/events.jsonl): {events.summary()}")
+print(f" LLM cache: {get_llm_cache().stats.as_dict()}")
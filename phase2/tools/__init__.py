@@ -0,0 +1,10 @@
+"""
+Tools for this phase. The phase runs as a script from its own directory, so importing this
+package is where the repo root goes onto sys.path and the shared `common` package resolves.
+"""
+import os
+import sys
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
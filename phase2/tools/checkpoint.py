@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import pandas as pd
+
+SPOOL_DIR = os.path.join("data", "spool")
+
+
+def config_fingerprint(config: dict) -> str:
+    """Stable hash of everything that changes what a batch cleans to (model, prompt, rules, bounds...)."""
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def batch_key(batch: pd.DataFrame, fingerprint: str) -> str:
+    """Content address of one batch under one pipeline config."""
+    digest = hashlib.sha256(fingerprint.encode("utf-8"))
+    digest.update(json.dumps([str(c) for c in batch.columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(batch, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:32]
+
+
+class BatchSpool:
+    """
+    Durable per-batch results for Phase 2 runs. Each finished batch is written
+    to its own file (tmp + rename) and recorded in an append-only, fsynced
+    manifest journal, so a crash loses at most the batches in flight. Batches are
+    keyed by content + config hash: a rerun skips every batch already done and
+    only reprocesses batches that failed, changed, or ran under another config.
+    """
+
+    def __init__(self, config: dict, spool_dir: str = SPOOL_DIR):
+        self.spool_dir = spool_dir
+        self.batch_dir = os.path.join(spool_dir, "batches")
+        self.manifest_path = os.path.join(spool_dir, "manifest.jsonl")
+        self.fingerprint = config_fingerprint(config)
+        self.entries: Dict[str, dict] = {}
+        self.hits = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.batch_dir, exist_ok=True)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash mid-append
+                self.entries[entry["key"]] = entry
+
+    def _append(self, entry: dict):
+        entry["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[entry["key"]] = entry
+
+    def key(self, batch: pd.DataFrame) -> str:
+        return batch_key(batch, self.fingerprint)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.batch_dir, f"{key}.ndjson")
+
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        """The stored result for a completed batch, or None if it still needs processing."""
+        entry = self.entries.get(key)
+        # Entries without recorded datetime columns predate them and would come back as epoch ints
+        if not entry or entry["status"] != "done" or "datetimes" not in entry or not os.path.exists(self._path(key)):
+            return None
+        with self._lock:
+            self.hits += 1
+        if entry["rows"] == 0:
+            return pd.DataFrame()
+        df = pd.read_json(self._path(key), lines=True, dtype=False, convert_dates=False)
+        for col, dtype in entry["datetimes"].items():
+            dtype = pd.api.types.pandas_dtype(dtype)
+            values = pd.to_datetime(df[col], format="ISO8601", utc=getattr(dtype, "tz", None) is not None)
+            df[col] = values.astype(dtype)
+        return df
+
+    def save(self, key: str, index: int, df: pd.DataFrame):
+        path = self._path(key)
+        tmp = path + ".tmp"
+        datetimes = {str(c): str(df[c].dtype) for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])}
+        with open(tmp, "w", encoding="utf-8") as f:
+            if len(df):
+                f.write(df.to_json(orient="records", lines=True, date_format="iso", date_unit="ns"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._append({"key": key, "batch": index, "status": "done", "rows": len(df), "datetimes": datetimes})
+
+    def mark_failed(self, key: str, index: int, error: str):
+        self._append({"key": key, "batch": index, "status": "failed", "error": error})
+
+    def summary(self) -> dict:
+        statuses = [e["status"] for e in self.entries.values()]
+        return {"done": statuses.count("done"), "failed": statuses.count("failed"), "reused": self.hits}
@@ -0,0 +1,115 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from common.field_mapping import get_mapper, llm_resolve_roles
+from tools.quantiles import build_sketches
+from tools.validation import RuleSet, to_number
+from tools.zoning import ZoningMatcher, get_zoning_matcher
+
+REQUIRED_ROLES = ["zoning", "property_type", "square_feet"]
+
+
+def resolve_roles(df: pd.DataFrame, use_llm: bool = True) -> Dict[str, Optional[str]]:
+    """Resolve the zoning / property type / square footage columns once per dataset."""
+    sample_rows = df.head(5).to_dict(orient="records")
+    return get_mapper().resolve_roles(
+        list(df.columns), REQUIRED_ROLES, sample_rows, llm_fallback=llm_resolve_roles if use_llm else None
+    )
+
+
+def normalize_zoning(series: pd.Series) -> pd.Series:
+    return series.astype(str).str.upper().str.strip()
+
+
+def industrial_mask(series: pd.Series, matcher: Optional[ZoningMatcher] = None, jurisdiction=None) -> np.ndarray:
+    return (matcher or get_zoning_matcher()).mask(series, jurisdiction)
+
+
+def outlier_columns(df: pd.DataFrame):
+    return [c for c in df.select_dtypes(include="number").columns if df[c].nunique() > 1]
+
+
+def iqr_bounds(values: np.ndarray) -> Tuple[float, float]:
+    q1, q3 = np.nanquantile(values, [0.25, 0.75])
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def outlier_mask(df: pd.DataFrame, columns=None, bounds: Optional[Dict[str, Tuple[float, float]]] = None) -> np.ndarray:
+    """
+    One combined IQR mask over all numeric columns, with every column's bounds
+    computed on the same frame (so earlier columns never shift later quantiles)
+    unless global `bounds` are given. NaNs are not outliers. Returns True for rows to keep.
+    """
+    if columns is None:
+        columns = [c for c in bounds if c in df.columns] if bounds is not None else outlier_columns(df)
+    keep = np.ones(len(df), dtype=bool)
+    for col in columns:
+        values = df[col].to_numpy(dtype=float)
+        lower, upper = bounds[col] if bounds and col in bounds else iqr_bounds(values)
+        keep &= ~((values < lower) | (values > upper))
+    return keep
+
+
+class CleaningEngine:
+    """
+    Deterministic Phase 2 cleaner: column roles are resolved once, then the
+    zoning filter, rule-set validation (see tools.validation) and outlier removal
+    run as vectorized operations over the whole frame. Rows failing only "review"
+    rules (by default, square footage present but unparseable) are returned as
+    anomalies for the agent.
+
+    For data larger than memory, fit_bounds() makes a first pass that sketches
+    every numeric column across all chunks; clean(chunk, bounds) then applies
+    the same global outlier fences to each chunk.
+    """
+
+    def __init__(self, roles: Dict[str, Optional[str]], rules: Optional[RuleSet] = None,
+                 zoning: Optional[ZoningMatcher] = None, jurisdiction_column: Optional[str] = None):
+        self.roles = roles
+        self.rules = rules or RuleSet.load()
+        self.zoning = zoning or get_zoning_matcher()
+        self.jurisdiction_column = jurisdiction_column
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, use_llm: bool = True, **kwargs) -> Optional["CleaningEngine"]:
+        roles = resolve_roles(df, use_llm=use_llm)
+        if not all(roles.get(r) in df.columns for r in REQUIRED_ROLES):
+            return None
+        return cls(roles, **kwargs)
+
+    def prepare(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+        """Zoning filter, rule validation and square footage coercion. Returns (rows, rows for review, step counts)."""
+        zoning_col = self.roles["zoning"]
+        sqft_col = self.roles["square_feet"]
+        stats = {"input": len(df)}
+
+        jurisdiction = df[self.jurisdiction_column] if self.jurisdiction_column in df.columns else None
+        df = df[industrial_mask(df[zoning_col], self.zoning, jurisdiction)].copy()
+        df[zoning_col] = normalize_zoning(df[zoning_col])
+        stats["industrial"] = len(df)
+
+        result = self.rules.validate(df, self.roles)
+        stats["valid"] = len(result.valid)
+        stats["anomalies"] = len(result.review)
+        stats["rule_failures"] = result.failures
+
+        df = result.valid.copy()
+        df[sqft_col] = to_number(df[sqft_col])
+        anomalies = result.review
+        return df, anomalies, stats
+
+    def fit_bounds(self, chunks: Iterable[pd.DataFrame], workers: int = 1) -> Dict[str, Tuple[float, float]]:
+        """Pass one: global IQR fences from quantile sketches over every prepared chunk."""
+        sketches = build_sketches(chunks, workers=workers, transform=lambda chunk: self.prepare(chunk)[0])
+        return sketches.iqr_bounds()
+
+    def clean(self, df: pd.DataFrame, bounds: Optional[Dict[str, Tuple[float, float]]] = None
+              ) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+        """Returns (clean rows, anomalous rows, step counts)."""
+        df, anomalies, stats = self.prepare(df)
+        df = df[outlier_mask(df, bounds=bounds)] if len(df) else df
+        stats["output"] = len(df)
+        return df.reset_index(drop=True), anomalies.reset_index(drop=True), stats
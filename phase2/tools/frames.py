@@ -0,0 +1,80 @@
+import itertools
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: only needed for to_arrow()
+    pa = None
+
+HANDLE_PREFIX = "frame:"
+
+
+def is_handle(data) -> bool:
+    return isinstance(data, str) and data.strip().startswith(HANDLE_PREFIX)
+
+
+class FrameRegistry:
+    """
+    In-process table store shared by the Phase 2 tools. Tools pass short handles
+    ("frame:3") instead of JSON strings, so a multi-step clean never serializes
+    the data between steps; JSON is produced only when an LLM needs to read rows.
+    """
+
+    def __init__(self):
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._children: Dict[str, List[str]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def put(self, df: pd.DataFrame, parent: Optional[str] = None) -> str:
+        """Register a frame. Frames derived from `parent` are released together with it."""
+        handle = f"{HANDLE_PREFIX}{next(self._ids)}"
+        with self._lock:
+            self._frames[handle] = df
+            if parent:
+                self._children.setdefault(parent.strip(), []).append(handle)
+        return handle
+
+    def get(self, handle: str) -> pd.DataFrame:
+        with self._lock:
+            df = self._frames.get(handle.strip())
+        if df is None:
+            raise KeyError(f"Unknown or released frame handle: {handle}")
+        return df
+
+    def mask(self, handle: str, keep: np.ndarray) -> str:
+        """Register the rows of `handle` where `keep` is True as a new frame."""
+        return self.put(self.get(handle)[keep], parent=handle)
+
+    def release(self, *handles: str):
+        """Drop frames and everything derived from them."""
+        with self._lock:
+            pending = [h.strip() for h in handles]
+            while pending:
+                handle = pending.pop()
+                self._frames.pop(handle, None)
+                pending.extend(self._children.pop(handle, []))
+
+    def to_json(self, handle: str, limit: Optional[int] = None) -> str:
+        df = self.get(handle)
+        return (df if limit is None else df.head(limit)).to_json(orient="records")
+
+    def to_arrow(self, handle: str):
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow export")
+        return pa.Table.from_pandas(self.get(handle), preserve_index=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._frames)
+
+
+_registry = FrameRegistry()
+
+
+def get_registry() -> FrameRegistry:
+    return _registry
@@ -0,0 +1,197 @@
+import os
+import shutil
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without pyarrow the processed output falls back to CSV
+    pa = pq = None
+
+
+class ProcessedWriter:
+    """
+    Streams cleaned chunks to data/processed as they are produced.
+
+    Parquet output keeps one schema across chunks (integers as int64, other
+    numbers as float64, text as string; a column that turns out to hold
+    fractions or text in a later chunk, or first appears there, widens the
+    schema and what was already written), stores
+    `dictionary_columns` (zoning, property type) as dictionary arrays so they
+    read back as categoricals, writes min/max statistics per row group for
+    predicate pushdown, and can partition by columns into a hive-style
+    directory. CSV output keeps the first chunk's column order, and a column
+    first seen in a later chunk rewrites the file with the wider header.
+    Files are written under a temporary name and swapped
+    in on close(), so readers never see a half-written output.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fmt: str = "parquet",
+        dictionary_columns: Sequence[str] = (),
+        partition_cols: Optional[List[str]] = None,
+        row_group_size: int = 100_000,
+    ):
+        if fmt == "parquet" and pq is None:
+            raise ImportError("pyarrow is required for Parquet output (pip install pyarrow)")
+        self.path = path
+        self.fmt = fmt
+        self.dictionary_columns = [c for c in dictionary_columns if c]
+        self.partition_cols = partition_cols or None
+        self.row_group_size = row_group_size
+        self.tmp_path = path + ".tmp"
+        self.schema = None
+        self.columns = None
+        self.rows = 0
+        self.parts = 0
+        self._writer = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._remove(self.tmp_path)
+
+    @staticmethod
+    def _remove(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _to_table(self, df: pd.DataFrame):
+        columns = {}
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_bool_dtype(series):
+                columns[col] = pa.array(series, from_pandas=True)
+            elif pd.api.types.is_integer_dtype(series):
+                # Ids such as pin must not come back as 96733128122853.0
+                columns[col] = pa.array(series, from_pandas=True).cast(pa.int64())
+            elif pd.api.types.is_numeric_dtype(series):
+                columns[col] = pa.array(series.astype(float), type=pa.float64(), from_pandas=True)
+            else:
+                text = series.astype("string")
+                array = pa.array(text, type=pa.string(), from_pandas=True)
+                if col in self.dictionary_columns:
+                    array = array.dictionary_encode()
+                columns[col] = array
+        return pa.table(columns)
+
+    @staticmethod
+    def _conform(table, schema):
+        """The table in `schema`'s columns and types; columns it lacks are written as nulls."""
+        arrays = []
+        for field in schema:
+            if field.name in table.column_names:
+                arrays.append(table[field.name].cast(field.type))
+            else:
+                arrays.append(pa.nulls(len(table), type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def _widened(self, table):
+        """
+        The schema extended for this chunk: new columns are appended, an integer column meeting
+        fractions becomes float64, and a column whose values do not fit the type seen so far
+        (text after an all-NaN float chunk, say) becomes string.
+        """
+        if self.schema is None:
+            return table.schema
+        fields = list(self.schema)
+        for field in table.schema:
+            i = self.schema.get_field_index(field.name)
+            if i < 0:
+                fields.append(field)
+                continue
+            current = self.schema.field(i).type
+            if field.type == current or pa.types.is_string(current) or pa.types.is_dictionary(current):
+                continue
+            try:
+                table[field.name].cast(current)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                numeric = all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in (current, field.type))
+                fields[i] = pa.field(field.name, pa.float64() if numeric else pa.string())
+        return pa.schema(fields)
+
+    def _file_schema(self):
+        # Hive partition columns live in the directory names, not in the part files
+        return pa.schema([f for f in self.schema if f.name not in (self.partition_cols or [])])
+
+    def _rewrite(self):
+        """Bring what was already written to the current schema (only after it was widened)."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            old_path = self.tmp_path + ".old"
+            os.replace(self.tmp_path, old_path)
+            old = pq.ParquetFile(old_path)
+            self._open_writer()
+            for i in range(old.num_row_groups):
+                self._writer.write_table(self._conform(old.read_row_group(i), self.schema),
+                                         row_group_size=self.row_group_size)
+            old.close()
+            os.remove(old_path)
+        elif self.partition_cols and os.path.isdir(self.tmp_path):
+            schema = self._file_schema()
+            for root, _, files in os.walk(self.tmp_path):
+                for name in files:
+                    part = os.path.join(root, name)
+                    pq.write_table(self._conform(pq.read_table(part, partitioning=None), schema), part,
+                                   use_dictionary=True, write_statistics=True, row_group_size=self.row_group_size)
+
+    def _rewrite_csv(self, chunk_size: int = 100_000):
+        """Bring the CSV written so far to the current column list (only after new columns appeared)."""
+        old_path = self.tmp_path + ".old"
+        os.replace(self.tmp_path, old_path)
+        # Read back as text so values are copied verbatim rather than re-inferred
+        for i, chunk in enumerate(pd.read_csv(old_path, dtype=str, keep_default_na=False, chunksize=chunk_size)):
+            chunk.reindex(columns=self.columns).to_csv(self.tmp_path, mode="a", header=i == 0, index=False)
+        os.remove(old_path)
+
+    def _open_writer(self):
+        self._writer = pq.ParquetWriter(self.tmp_path, self.schema, use_dictionary=True,
+                                        write_statistics=True, compression="zstd")
+
+    def write(self, df: pd.DataFrame):
+        if df is None or not len(df):
+            return
+        if self.fmt == "csv":
+            new = [c for c in df.columns if c not in (self.columns or [])]
+            self.columns = (self.columns or []) + new
+            if new and self.parts:
+                self._rewrite_csv()
+            df.reindex(columns=self.columns).to_csv(self.tmp_path, mode="a", header=self.parts == 0, index=False)
+            self.parts += 1
+            self.rows += len(df)
+            return
+        table = self._to_table(df)
+        schema = self._widened(table)
+        widened = self.schema is not None and not schema.equals(self.schema)
+        self.schema = schema
+        if widened:
+            self._rewrite()
+        table = self._conform(table, schema)
+        if self.partition_cols:
+            pq.write_to_dataset(
+                table,
+                root_path=self.tmp_path,
+                partition_cols=self.partition_cols,
+                basename_template=f"part-{self.parts}-{{i}}.parquet",
+                use_dictionary=True,
+                write_statistics=True,
+                row_group_size=self.row_group_size,
+            )
+        else:
+            if self._writer is None:
+                self._open_writer()
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+        self.parts += 1
+        self.rows += len(df)
+
+    def close(self) -> dict:
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp_path):
+            self._remove(self.path)
+            os.replace(self.tmp_path, self.path)
+        return {"path": self.path, "format": self.fmt, "rows": self.rows}
@@ -0,0 +1,216 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Exception class names worth retrying (OpenAI / httpx / requests transient failures)
+TRANSIENT_ERRORS = {
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "ServiceUnavailableError", "Timeout", "TimeoutError", "ConnectionError", "ReadTimeout",
+}
+
+
+def is_transient(error: BaseException) -> bool:
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """Allows `rate_per_minute` acquisitions per minute with bursts up to `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+@dataclass
+class BatchResult:
+    index: int
+    value: Any = None
+    error: Optional[str] = None
+    attempts: int = 0
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class SchedulerStats:
+    completed: int = 0
+    failed: int = 0
+    reused: int = 0
+    retries: int = 0
+    in_flight: int = 0
+    queue_depth: int = 0
+    peak_queue_depth: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def batches_per_min(self) -> float:
+        return (self.completed + self.failed) * 60 / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "reused": self.reused,
+            "retries": self.retries,
+            "peak_queue_depth": self.peak_queue_depth,
+            "elapsed_sec": round(self.elapsed, 3),
+            "batches_per_min": round(self.batches_per_min, 1),
+        }
+
+
+class BatchScheduler:
+    """
+    Runs `worker(index, batch)` over a stream of batches with at most
+    `concurrency` calls in flight, a shared token bucket in front of every call
+    (including retries), and exponential backoff with full jitter for transient
+    errors. Results are delivered to `on_result` in batch order; only a bounded
+    window of batches is read ahead of the slowest one still running. A batch
+    for which `lookup(index, batch)` returns a value (e.g. from a checkpoint
+    spool) completes with that value without calling the worker.
+    """
+
+    def __init__(
+        self,
+        worker: Callable[[int, Any], Any],
+        concurrency: int = 4,
+        requests_per_minute: Optional[float] = 60.0,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        retryable: Callable[[BaseException], bool] = is_transient,
+        progress_every: int = 10,
+        lookup: Optional[Callable[[int, Any], Any]] = None,
+    ):
+        self.worker = worker
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retryable = retryable
+        self.progress_every = progress_every
+        self.lookup = lookup
+        self.stats = SchedulerStats()
+        self._stats_lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _run_batch(self, index: int, batch) -> BatchResult:
+        started = time.monotonic()
+        with self._stats_lock:
+            self.stats.in_flight += 1
+        try:
+            if self.lookup:
+                value = self.lookup(index, batch)
+                if value is not None:
+                    with self._stats_lock:
+                        self.stats.reused += 1
+                    return BatchResult(index, value, attempts=0, latency=time.monotonic() - started)
+            for attempt in range(self.max_retries + 1):
+                if self.bucket:
+                    self.bucket.acquire()
+                try:
+                    value = self.worker(index, batch)
+                    return BatchResult(index, value, attempts=attempt + 1, latency=time.monotonic() - started)
+                except Exception as e:
+                    if attempt == self.max_retries or not self.retryable(e):
+                        return BatchResult(index, error=f"{type(e).__name__}: {e}", attempts=attempt + 1,
+                                           latency=time.monotonic() - started)
+                    with self._stats_lock:
+                        self.stats.retries += 1
+                    time.sleep(self._backoff(attempt))
+        finally:
+            with self._stats_lock:
+                self.stats.in_flight -= 1
+
+    def _report_progress(self):
+        s = self.stats
+        print(
+            f"→ {s.completed} batches ok, {s.failed} failed | {s.batches_per_min:,.1f} batches/min | "
+            f"{s.in_flight} in flight, queue depth {s.queue_depth}"
+        )
+
+    def run(
+        self,
+        batches: Iterable[Any],
+        on_result: Optional[Callable[[BatchResult], None]] = None,
+        start_index: int = 1,
+    ) -> List[BatchResult]:
+        """Process every batch. Returns the failed results in batch order."""
+        self.stats = SchedulerStats()
+        failed: List[BatchResult] = []
+        ready: Dict[int, BatchResult] = {}
+        iterator = enumerate(batches, start=start_index)
+        exhausted = False
+        deliver_index = start_index
+        window = self.concurrency * 2
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {}
+            while True:
+                # Read ahead at most `window` batches past the next one to deliver
+                while not exhausted and len(futures) + len(ready) < window:
+                    item = next(iterator, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    index, batch = item
+                    futures[pool.submit(self._run_batch, index, batch)] = index
+                with self._stats_lock:
+                    self.stats.queue_depth = max(0, len(futures) - self.stats.in_flight)
+                    self.stats.peak_queue_depth = max(self.stats.peak_queue_depth, self.stats.queue_depth)
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    ready[futures.pop(future)] = result
+
+                # Deliver in batch order so output and checkpoints follow the input
+                while deliver_index in ready:
+                    result = ready.pop(deliver_index)
+                    deliver_index += 1
+                    with self._stats_lock:
+                        if result.ok:
+                            self.stats.completed += 1
+                        else:
+                            self.stats.failed += 1
+                    if not result.ok:
+                        failed.append(result)
+                    if on_result:
+                        on_result(result)
+                    delivered = self.stats.completed + self.stats.failed
+                    if self.progress_every and delivered % self.progress_every == 0:
+                        self._report_progress()
+
+        self.stats.finished = time.monotonic()
+        return failed
@@ -1,13 +1,28 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
 import pandas as pd
 from io import StringIO
 import json
 from dotenv import load_dotenv
-import os
+
+from common.events import get_event_log
+from common.field_mapping import get_mapper, llm_resolve_roles
+from tools.engine import outlier_mask
+from tools.frames import get_registry, is_handle
+from tools.validation import RuleSet
+from tools.zoning import get_zoning_matcher
 
 load_dotenv()
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+
+# Global IQR fences from a sketch pass over the whole dataset (see set_outlier_bounds)
+_outlier_bounds = None
+
+def set_outlier_bounds(bounds):
+    """Make detect_outliers use dataset-wide fences instead of per-batch quantiles."""
+    global _outlier_bounds
+    _outlier_bounds = bounds
+
+def get_outlier_bounds():
+    return _outlier_bounds
 
 def load_data_from_string(data_str: str) -> pd.DataFrame:
     try:
@@ -25,48 +40,48 @@ def load_data_from_string(data_str: str) -> pd.DataFrame:
         except Exception as e:
             raise ValueError("Unsupported format or malformed data.") from e
 
+def load_frame(data: str) -> pd.DataFrame:
+    """A frame handle resolves from the shared registry; anything else is parsed as JSON/CSV text."""
+    if is_handle(data):
+        return get_registry().get(data)
+    return load_data_from_string(data)
+
+def emit_frame(df: pd.DataFrame, data: str) -> str:
+    """Answer in the caller's currency: a new handle for handle input, JSON records otherwise."""
+    if is_handle(data):
+        return get_registry().put(df, parent=data)
+    return df.to_json(orient="records")
+
 @tool
 def validate_required_fields(df_data: str) -> str:
     """
-    Validates required fields by letting LLM infer zoning, property type, and square footage columns
-    from both column names and sample data rows.
+    Validates required fields and value constraints (e.g. positive square footage) from the
+    default rule set. Zoning, property type, and square footage columns are resolved
+    by the shared field mapping engine; the LLM only sees columns it cannot resolve.
+    Accepts a frame handle (returns a new handle) or JSON records (returns JSON).
     """
     try:
-        df = load_data_from_string(df_data)
+        df = load_frame(df_data)
         if df.empty:
             return json.dumps([{"error": "Empty DataFrame"}])
 
-        columns = list(df.columns)
-        sample_rows = df[columns].head(3).to_dict(orient="records")
-        prompt = (
-            "Dataset sample rows:\n"
-            f"{json.dumps(sample_rows, indent=2)}\n\n"
-            "Based on both column names and the data, which column is most likely:\n"
-            "- zoning or use code column (zoning codes look like M1, M2, I-1, etc.)\n"
-            "- property type column\n"
-            "- building square footage column\n"
-            "Return JSON like: {\"zoning\": \"...\", \"property_type\": \"...\", \"square_feet\": \"...\"}.\n"
-            "If you cannot identify, use null values."
+        sample_rows = df.head(3).to_dict(orient="records")
+        mapping = get_mapper().resolve_roles(
+            list(df.columns), ["zoning", "property_type", "square_feet"], sample_rows, llm_fallback=llm_resolve_roles
         )
 
-        response = llm.invoke(prompt)
-        mapping = json.loads(response)
-
         zoning_col = mapping.get("zoning")
         type_col = mapping.get("property_type")
         sqft_col = mapping.get("square_feet")
 
-        if not all([zoning_col, type_col, sqft_col]) or any(x is None for x in [zoning_col, type_col, sqft_col]):
-            return json.dumps([{"error": "LLM failed to resolve all required columns."}])
+        if not all([zoning_col, type_col, sqft_col]):
+            return json.dumps([{"error": "Failed to resolve all required columns."}])
 
-        required = [zoning_col, type_col, sqft_col]
-        df["missing_fields"] = df.apply(
-            lambda row: [f for f in required if pd.isna(row.get(f)) or row.get(f) in ("", "NA", "")],
-            axis=1
-        )
-        df_valid = df[df["missing_fields"].apply(lambda x: len(x) == 0)].drop(columns=["missing_fields"])
+        # Declarative rules, one vectorized pass; rows flagged only for review are kept for the agent to judge
+        result = RuleSet.load().validate(df, mapping)
+        df_valid = df[~result.dropped]
 
-        return df_valid.to_json(orient="records")
+        return emit_frame(df_valid, df_data)
 
     except Exception as e:
         return json.dumps([{"error": f"Field validation failed: {str(e)}"}])
@@ -74,11 +89,12 @@ def validate_required_fields(df_data: str) -> str:
 @tool
 def detect_outliers(data: str) -> str:
     """
-    Removes numerical outliers using IQR filtering.
-    Only processes numeric columns with more than one unique value.
+    Removes numerical outliers using IQR filtering, with dataset-wide fences when the
+    pipeline has set them. Only processes numeric columns with more than one unique value.
+    Accepts a frame handle (returns a new handle) or JSON records (returns JSON).
     """
     try:
-        df = load_data_from_string(data)
+        df = load_frame(data)
         if df.empty:
             return json.dumps([{"warning": "Empty dataset. No outliers to remove."}])
 
@@ -86,15 +102,13 @@ def detect_outliers(data: str) -> str:
         if not numeric_cols:
             return json.dumps([{"warning": "No numeric columns with variance. Skipping outlier detection."}])
 
-        for col in numeric_cols:
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower = Q1 - 1.5 * IQR
-            upper = Q3 + 1.5 * IQR
-            df = df[(df[col] >= lower) & (df[col] <= upper)]
+        # One combined mask, so filtering one column never shifts the next column's quantiles
+        if _outlier_bounds is not None:
+            df = df[outlier_mask(df, bounds=_outlier_bounds)]
+        else:
+            df = df[outlier_mask(df, columns=numeric_cols)]
 
-        return df.to_json(orient="records")
+        return emit_frame(df, data)
 
     except Exception as e:
         return json.dumps([{"error": f"Outlier detection failed: {str(e)}"}])
@@ -102,31 +116,27 @@ def detect_outliers(data: str) -> str:
 @tool
 def filter_industrial_zoning(data: str) -> str:
     """
-    Filters industrial properties using LLM to detect the zoning-related column,
-    and matches against known industrial codes like M1, M2, I-1, 208, etc.
+    Filters industrial properties using the shared field mapping engine to detect the zoning-related
+    column (LLM fallback only when unresolved), and matches codes against the jurisdiction's industrial
+    patterns in config/zoning.json (M1, M-1, M1-A, I-2(PD), 5-*, 208, etc.).
+    Accepts a frame handle (returns a new handle) or JSON records (returns JSON).
     """
     try:
-        df = load_data_from_string(data)
+        df = load_frame(data)
         if df.empty:
             return json.dumps([])
 
-        columns = list(df.columns)
-        sample_rows = df[columns].head(3).to_dict(orient="records")
-        prompt = (
-            "You are identifying the zoning/use code column in tabular data.\n"
-            "Here is a data sample:\n"
-            f"{json.dumps(sample_rows, indent=2)}\n\n"
-            "Which column holds the property zoning or land-use classification, such as M1, M2, I-1, I-2, 208, 209, etc.?\n"
-            "Return the column name as a plain string. If you see none, reply null."
-        )
-        zoning_col = llm.invoke(prompt).strip().strip('"')
-        if zoning_col == "null" or zoning_col not in df.columns:
-            return json.dumps([{"error": f"LLM-guessed column '{zoning_col}' not found."}])
+        sample_rows = df.head(3).to_dict(orient="records")
+        zoning_col = get_mapper().resolve_roles(
+            list(df.columns), ["zoning"], sample_rows, llm_fallback=llm_resolve_roles
+        ).get("zoning")
+        if zoning_col is None or zoning_col not in df.columns:
+            return json.dumps([{"error": f"Zoning column '{zoning_col}' not found."}])
 
-        df[zoning_col] = df[zoning_col].astype(str).str.upper().str.strip()
-        industrial_codes = {"M1", "M2", "I-1", "I-2", "I1", "I2", "208", "209", "210", "211"}
-        df = df[df[zoning_col].isin(industrial_codes)]
-        return df.to_json(orient="records")
+        keep = get_zoning_matcher().mask(df[zoning_col])
+        df = df[keep]
+        df = df.assign(**{zoning_col: df[zoning_col].astype(str).str.upper().str.strip()})
+        return emit_frame(df, data)
 
     except Exception as e:
         return json.dumps([{"error": f"Zoning filter failed: {str(e)}"}])
@@ -134,15 +144,29 @@ def filter_industrial_zoning(data: str) -> str:
 @tool
 def log_errors_tool(error_context: str) -> str:
     """
-    Logs error messages to console and to a log file.
+    Logs an error to the shared event log (data/logs/events.jsonl).
+    Accepts free text or a JSON object with stage, batch, error, error_class and any extra context.
     """
     try:
-        print(f"[ERROR LOG]: {error_context}")
-        log_dir = "data/logs"
-        os.makedirs(log_dir, exist_ok=True)
-        log_file = os.path.join(log_dir, "error_log.txt")
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(error_context.strip() + "\n")
+        try:
+            context = json.loads(error_context)
+        except ValueError:
+            context = None
+        if not isinstance(context, dict):
+            context = {"error": error_context.strip()}
+        message = str(context.pop("error", "") or "")
+        error_class = context.pop("error_class", None)
+        if error_class is None and ": " in message:
+            # Scheduler errors arrive as "ExceptionClass: message"
+            head = message.split(": ", 1)[0]
+            error_class = head if head.isidentifier() else None
+        get_event_log().error(
+            context.pop("stage", "agent"),
+            message,
+            batch=context.pop("batch", None),
+            error_class=error_class,
+            **context,
+        )
         return f"Logged: {error_context}"
     except Exception as e:
         return f"Logging failed: {str(e)}"
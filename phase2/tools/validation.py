@@ -0,0 +1,133 @@
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+NULL_SENTINELS = ("", "NA")
+
+# Declarative defaults. `role` names a column resolved by the field mapping engine
+# (or `column` names one directly). Rows failing a "review" rule are not dropped but
+# handed back for a second look (by default, square footage that is present but unparseable).
+DEFAULT_RULES = [
+    {"name": "zoning_required", "role": "zoning", "check": "required"},
+    {"name": "property_type_required", "role": "property_type", "check": "required"},
+    {"name": "square_feet_required", "role": "square_feet", "check": "required"},
+    {"name": "square_feet_numeric", "role": "square_feet", "check": "numeric", "severity": "review"},
+    {"name": "square_feet_positive", "role": "square_feet", "check": "range", "min": 0, "min_inclusive": False},
+]
+
+
+@dataclass
+class Rule:
+    name: str
+    check: str  # required | numeric | range
+    role: Optional[str] = None
+    column: Optional[str] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    min_inclusive: bool = True
+    max_inclusive: bool = True
+    severity: str = "drop"  # drop | review
+
+    def target(self, roles: Dict[str, Optional[str]]) -> Optional[str]:
+        return self.column or roles.get(self.role)
+
+
+@dataclass
+class ValidationResult:
+    valid: pd.DataFrame
+    review: pd.DataFrame
+    failures: Dict[str, int]
+    matrix: np.ndarray = field(repr=False)  # rows x rules, True where the rule failed
+    dropped: np.ndarray = field(repr=False)  # rows failing at least one "drop" rule
+
+    @property
+    def invalid_rows(self) -> int:
+        return int(self.matrix.any(axis=1).sum())
+
+
+def to_number(series: pd.Series) -> pd.Series:
+    """Numeric view of a column; strings like '12,500' parse, anything else becomes NaN."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    return pd.to_numeric(series.astype(str).str.replace(",", "", regex=False).str.strip(), errors="coerce")
+
+
+def null_mask(series: pd.Series, sentinels: Sequence[str] = NULL_SENTINELS) -> np.ndarray:
+    mask = series.isna().to_numpy().copy()
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        mask |= series.astype(str).str.strip().isin(sentinels).to_numpy()
+    return mask
+
+
+class RuleSet:
+    """
+    Validates a frame against declarative rules in one vectorized pass: each
+    rule contributes one column of a boolean failure matrix, each target column
+    is null-checked and parsed at most once, and the per-rule failure counts come
+    straight from the matrix.
+    """
+
+    def __init__(self, rules: List[Rule], null_sentinels: Sequence[str] = NULL_SENTINELS):
+        self.rules = rules
+        self.null_sentinels = tuple(null_sentinels)
+
+    @classmethod
+    def from_config(cls, config) -> "RuleSet":
+        """Build from a list of rule dicts or {"rules": [...], "null_sentinels": [...]}."""
+        if isinstance(config, dict):
+            rules, sentinels = config.get("rules", DEFAULT_RULES), config.get("null_sentinels", NULL_SENTINELS)
+        else:
+            rules, sentinels = config, NULL_SENTINELS
+        return cls([Rule(**r) for r in rules], sentinels)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "RuleSet":
+        if not path:
+            return cls.from_config(DEFAULT_RULES)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_config(json.load(f))
+
+    def targets(self, roles: Dict[str, Optional[str]]) -> List[str]:
+        return list(dict.fromkeys(t for t in (r.target(roles) for r in self.rules) if t))
+
+    def evaluate(self, df: pd.DataFrame, roles: Dict[str, Optional[str]]) -> np.ndarray:
+        matrix = np.zeros((len(df), len(self.rules)), dtype=bool)
+        nulls, numbers = {}, {}
+        for j, rule in enumerate(self.rules):
+            col = rule.target(roles)
+            if col is None or col not in df.columns:
+                if rule.check == "required":
+                    matrix[:, j] = True  # a required column that does not exist fails every row
+                continue
+            if col not in nulls:
+                nulls[col] = null_mask(df[col], self.null_sentinels)
+            if rule.check == "required":
+                matrix[:, j] = nulls[col]
+                continue
+            if col not in numbers:
+                numbers[col] = to_number(df[col]).to_numpy(dtype=float)
+            values = numbers[col]
+            if rule.check == "numeric":
+                # Missing values are the required rule's business
+                matrix[:, j] = np.isnan(values) & ~nulls[col]
+            elif rule.check == "range":
+                bad = np.zeros(len(df), dtype=bool)
+                if rule.min is not None:
+                    bad |= values < rule.min if rule.min_inclusive else values <= rule.min
+                if rule.max is not None:
+                    bad |= values > rule.max if rule.max_inclusive else values >= rule.max
+                matrix[:, j] = bad  # NaN compares False, so unparseable values never fail a range
+            else:
+                raise ValueError(f"Unknown check '{rule.check}' in rule {rule.name}")
+        return matrix
+
+    def validate(self, df: pd.DataFrame, roles: Dict[str, Optional[str]]) -> ValidationResult:
+        matrix = self.evaluate(df, roles)
+        review_cols = np.array([r.severity == "review" for r in self.rules], dtype=bool)
+        drop = matrix[:, ~review_cols].any(axis=1)
+        review = ~drop & matrix[:, review_cols].any(axis=1)
+        failures = {r.name: int(n) for r, n in zip(self.rules, matrix.sum(axis=0))}
+        return ValidationResult(df[~drop & ~review], df[review], failures, matrix, drop)
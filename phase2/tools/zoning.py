@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+ZONING_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "zoning.json")
+DEFAULT_JURISDICTION = "default"
+
+CODE_CHARS = r"[A-Z0-9./-]"
+SUBDISTRICT = rf"(?:[-.]{CODE_CHARS}+)?"
+OVERLAY = r"(?:\s*\([^)]*\))?"
+
+
+def normalize_code(value) -> str:
+    return " ".join(str(value).upper().split())
+
+
+def compile_pattern(pattern: str) -> str:
+    """
+    Translate one config pattern to a regex fragment: '*' is any run of code
+    characters, a trailing '-*' an optional sub-district suffix, and a hyphen
+    between a letter and a digit is optional whether or not it is written.
+    """
+    if pattern.startswith("regex:"):
+        return pattern[len("regex:"):]
+    core = normalize_code(pattern)
+    suffix = ""
+    if core.endswith("-*"):
+        core, suffix = core[:-2], SUBDISTRICT
+    out: List[str] = []
+    prev = ""
+    for ch in core:
+        if ch == "*":
+            out.append(f"{CODE_CHARS}*")
+        elif ch == "-":
+            out.append("-?")
+        else:
+            if prev.isalnum() and ch.isalnum() and prev.isalpha() != ch.isalpha():
+                out.append("-?")
+            out.append(re.escape(ch))
+        prev = ch
+    return "".join(out) + suffix
+
+
+def compile_patterns(patterns: List[str]) -> "re.Pattern":
+    """All of a jurisdiction's patterns as one anchored alternation."""
+    body = "|".join(f"(?:{compile_pattern(p)})" for p in patterns)
+    return re.compile(rf"(?:{body}){OVERLAY}$")
+
+
+class ZoningMatcher:
+    """
+    Classifies zoning codes as industrial using per-jurisdiction pattern sets
+    from config/zoning.json. Zoning columns have few distinct values, so each
+    distinct (jurisdiction, code) is matched once, vectorized with str.match,
+    and remembered; every row after that is an array lookup.
+    """
+
+    def __init__(self, jurisdictions: Dict[str, List[str]], default: str = DEFAULT_JURISDICTION):
+        if default not in jurisdictions:
+            raise KeyError(f"Unknown zoning jurisdiction '{default}'; known: {sorted(jurisdictions)}")
+        self.default = default
+        self.patterns = {name: compile_patterns(codes) for name, codes in jurisdictions.items()}
+        self._memo: Dict[Tuple[str, str], bool] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str = ZONING_CONFIG_PATH, default: str = DEFAULT_JURISDICTION) -> "ZoningMatcher":
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        jurisdictions = {name: spec["industrial"] for name, spec in config.items() if not name.startswith("_")}
+        return cls(jurisdictions, default)
+
+    def _resolve(self, jurisdiction: Optional[str]) -> str:
+        name = (jurisdiction or self.default).strip().lower().replace(" ", "_")
+        return name if name in self.patterns else self.default
+
+    def is_industrial(self, code, jurisdiction: Optional[str] = None) -> bool:
+        return bool(self.mask(pd.Series([code]), jurisdiction)[0])
+
+    def mask(self, codes: pd.Series, jurisdiction: Union[str, pd.Series, None] = None) -> np.ndarray:
+        """True for industrial codes. `jurisdiction` is one name for all rows or a per-row Series."""
+        # Factorize raw values first so normalization and matching only touch distinct codes
+        code_idx, code_uniques = pd.factorize(codes.to_numpy(), use_na_sentinel=False)
+        if isinstance(jurisdiction, pd.Series):
+            jur_idx, jur_uniques = pd.factorize(jurisdiction.fillna("").astype(str).to_numpy())
+            names = [self._resolve(j) for j in jur_uniques]
+            row_idx, pairs = pd.factorize(jur_idx.astype(np.int64) * len(code_uniques) + code_idx)
+        else:
+            names = [self._resolve(jurisdiction)]
+            row_idx, pairs = code_idx, np.arange(len(code_uniques))
+        normalized = [normalize_code(c) if not pd.isna(c) else "" for c in code_uniques]
+        keys = [(names[p // len(code_uniques)], normalized[p % len(code_uniques)]) for p in pairs]
+
+        with self._lock:
+            unknown = [key for key in dict.fromkeys(keys) if key not in self._memo]
+        if unknown:
+            pending = pd.DataFrame(unknown, columns=["jurisdiction", "code"])
+            for name, group in pending.groupby("jurisdiction"):
+                matched = group["code"].str.match(self.patterns[name]).to_numpy()
+                with self._lock:
+                    self._memo.update({(name, code): bool(m) for code, m in zip(group["code"], matched)})
+
+        with self._lock:
+            lookup = np.array([self._memo[key] for key in keys], dtype=bool)
+        return lookup[row_idx]
+
+
+_matchers: Dict[str, ZoningMatcher] = {}
+
+
+def get_zoning_matcher(jurisdiction: Optional[str] = None) -> ZoningMatcher:
+    """Shared matcher; the default jurisdiction comes from ZONING_JURISDICTION when not given."""
+    jurisdiction = jurisdiction or os.getenv("ZONING_JURISDICTION", DEFAULT_JURISDICTION)
+    if jurisdiction not in _matchers:
+        _matchers[jurisdiction] = ZoningMatcher.from_config(default=jurisdiction)
+    return _matchers[jurisdiction]
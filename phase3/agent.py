@@ -1,15 +1,20 @@
-from utils import load_data_from_file, infer_column_mapping
+from utils import load_scoring_frame, prepare_scoring_columns
 from comparable import find_comparables, get_subject_dict
+from spatial import SpatialIndex
+from batch import batch_comparables, write_batch_output
 from prompt_template import comparable_explanation_prompt
-from langchain_openai import ChatOpenAI
-import pandas as pd 
+from common.llm_cache import LLMCacheMiss, get_llm_cache
+from common.streaming import default_output_format, output_path
+import os
 from dotenv import load_dotenv
 load_dotenv()
 
 WEIGHTS = {"type":0.35, "location":0.35, "size":0.2, "age":0.1}
 
-#The path is of raw_input, but after debugging, this should be the path of processed data which shall reside in "data/processed/".
-DEFAULT_PATH = "C:/Users/devra/Desktop/starboard_ai - Copy/Starboard-Property-Analysis/phase1/data/raw/raw_input.json" #Change this path as required.
+# Phase 2's processed output, in whichever layout it was written
+DEFAULT_PATH = next((p for p in (output_path("parquet"), output_path("parquet", partitioned=True), output_path("csv"))
+                     if os.path.exists(p)), output_path(default_output_format()))
+DEFAULT_BATCH_OUTPUT = os.path.join("outputs", "batch_comparables.parquet")
 
 
 def display_property_options(df, mapping, limit=10):
@@ -57,23 +62,13 @@ def get_user_property_selection(df, mapping):
         except (ValueError, IndexError):
             print("Invalid selection. Please try again.")
 
-def run_comparables(filepath=None, subject_criteria=None, top_n=5, explain=True, interactive=True):
+def run_comparables(filepath=None, subject_criteria=None, top_n=5, explain=True, interactive=True, property_types=None,
+                    radius_km=None, k_nearest=None):
     filepath = filepath or DEFAULT_PATH
-    df = load_data_from_file(filepath)
-
-    mapping = infer_column_mapping(df)
+    # Only the scored columns are read; Parquet input also skips row groups of other property types
+    df, mapping = load_scoring_frame(filepath, property_types=property_types)
     print(f"Column mapping detected: {mapping}")
-
-    # Handle numeric conversions
-    for k in ["size", "age"]:
-        col = mapping.get(k)
-        if col and col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-    
-    # Handle year-built as age
-    if mapping.get("age") and "year" in mapping.get("age", "").lower():
-        df["__computed_age"] = 2024 - pd.to_numeric(df[mapping["age"]], errors="coerce")
-        mapping["age"] = "__computed_age"
+    df, mapping = prepare_scoring_columns(df, mapping)
 
     # Interactive vs programmatic selection
     if interactive and not subject_criteria:
@@ -87,7 +82,10 @@ def run_comparables(filepath=None, subject_criteria=None, top_n=5, explain=True,
     print(f"Size: {subject.get(mapping['size'], 'N/A')} sqft")
     print(f"Age: {subject.get(mapping['age'], 'N/A')} years")
 
-    comps = find_comparables(subject, df, mapping, WEIGHTS, top_n=top_n)
+    # With a radius or k-nearest limit, only nearby candidates are scored (grid index built once per dataset)
+    index = SpatialIndex.from_frame(df) if radius_km is not None or k_nearest is not None else None
+    comps = find_comparables(subject, df, mapping, WEIGHTS, top_n=top_n, index=index,
+                             radius_km=radius_km, k_nearest=k_nearest)
     
     print(f"\n=== TOP {top_n} COMPARABLE PROPERTIES ===")
     for idx, comp in enumerate(comps, 1):
@@ -97,16 +95,45 @@ def run_comparables(filepath=None, subject_criteria=None, top_n=5, explain=True,
         print(f"   Size: {comp.get(mapping['size'],'N/A')} sqft")
         
         if explain:
-            llm = ChatOpenAI(model="gpt-4.1", temperature=0)
             subj_dict = {k: subject.get(k) for k in mapping.values() if k}
             comp_dict = {k: comp.get(k) for k in mapping.values() if k}
             prompt = comparable_explanation_prompt(str(subj_dict), str(comp_dict))
-            explanation = llm.invoke(prompt)
-            explanation = explanation.content if hasattr(explanation, "content") else explanation
+            try:
+                explanation = get_llm_cache().complete(prompt, model="gpt-4.1", temperature=0)
+            except LLMCacheMiss:
+                # Replay mode never calls the API; comps without a recorded explanation still print
+                explanation = "(no recorded explanation for this comparable; rerun without LLM_CACHE_MODE=replay)"
             print(f"   Explanation: {explanation.strip()}")
-    
+
+    if explain:
+        print(f"\nLLM cache: {get_llm_cache().stats.as_dict()}")
     return comps
 
+def read_subject_ids(path, id_column=None):
+    """One subject id per line; blank lines are skipped, and so is a first line naming id_column (a CSV header)."""
+    with open(path, "r", encoding="utf-8") as f:
+        ids = [line.strip() for line in f if line.strip()]
+    if ids and id_column and ids[0].strip('"') == id_column:
+        ids = ids[1:]
+    return ids
+
+def run_batch_comparables(filepath=None, subject_ids=None, id_column=None, top_n=5, property_types=None,
+                          workers=1, output=DEFAULT_BATCH_OUTPUT):
+    """Top comps for many subjects (all rows when subject_ids is None), written as one columnar table."""
+    filepath = filepath or DEFAULT_PATH
+    df, mapping = load_scoring_frame(filepath, property_types=property_types,
+                                     extra_columns=[id_column] if id_column else None)
+    print(f"Column mapping detected: {mapping}")
+    if id_column and id_column not in df.columns:
+        raise ValueError(f"Id column '{id_column}' not found in {filepath}")
+    df, mapping = prepare_scoring_columns(df, mapping)
+
+    results = batch_comparables(df, mapping, subject_ids, id_column=id_column, weights=WEIGHTS,
+                                top_n=top_n, workers=workers)
+    path = write_batch_output(results, output)
+    print(f"\n{results['subject_id'].nunique()} subjects, {len(results)} comparables saved to '{path}'")
+    return results
+
 if __name__ == "__main__":
     import argparse
     
@@ -115,12 +142,37 @@ if __name__ == "__main__":
     parser.add_argument("--top-n", type=int, default=5, help="Number of comparables to return")
     parser.add_argument("--no-interactive", action="store_true", help="Skip interactive selection")
     parser.add_argument("--no-explain", action="store_true", help="Skip LLM explanations")
+    parser.add_argument("--types", nargs="+", help="Only consider these property types (pushed down into Parquet reads)")
+    parser.add_argument("--radius-km", type=float, help="Only score candidates within this distance of the subject")
+    parser.add_argument("--nearest", type=int, help="Only score the N candidates nearest the subject")
+    parser.add_argument("--batch", action="store_true", help="Find comps for many subjects and write one table")
+    parser.add_argument("--subjects", nargs="+", help="With --batch: subject ids (default: every property)")
+    parser.add_argument("--subjects-file", help="With --batch: file with one subject id per line")
+    parser.add_argument("--id-column", help="With --batch: column holding property ids (default: row number)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="With --batch: scoring processes (never more than there are blocks of subjects)")
+    parser.add_argument("--output", default=DEFAULT_BATCH_OUTPUT, help="With --batch: output path (.parquet or .csv)")
     
     args = parser.parse_args()
-    
-    run_comparables(
-        filepath=args.filepath,
-        top_n=args.top_n,
-        explain=not args.no_explain,
-        interactive=not args.no_interactive
-    )
+
+    if args.batch:
+        subject_ids = args.subjects or (read_subject_ids(args.subjects_file, args.id_column) if args.subjects_file else None)
+        run_batch_comparables(
+            filepath=args.filepath,
+            subject_ids=subject_ids,
+            id_column=args.id_column,
+            top_n=args.top_n,
+            property_types=args.types,
+            workers=args.workers,
+            output=args.output,
+        )
+    else:
+        run_comparables(
+            filepath=args.filepath,
+            top_n=args.top_n,
+            explain=not args.no_explain,
+            interactive=not args.no_interactive,
+            property_types=args.types,
+            radius_km=args.radius_km,
+            k_nearest=args.nearest,
+        )
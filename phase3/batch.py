@@ -0,0 +1,223 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from comparable import get_type_similarity, round_scores
+from spatial import valid_coords
+from utils import EARTH_RADIUS_KM
+
+DEFAULT_WEIGHTS = {'type': 0.35, 'location': 0.35, 'size': 0.2, 'age': 0.1}
+COMPONENTS = ["type", "location", "size", "age"]
+
+
+def _float_column(df: pd.DataFrame, col) -> np.ndarray:
+    if col is None or col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+@dataclass
+class ScoringArrays:
+    """
+    The columns comparables are scored on, as plain arrays: property types as integer codes
+    into a TypeSimilarityMatrix, coordinates, size and age as floats. Built once per dataset
+    and shared by every subject (and every worker process).
+    """
+    ids: np.ndarray
+    type_codes: np.ndarray
+    types: object
+    lats: np.ndarray
+    lons: np.ndarray
+    sizes: np.ndarray
+    ages: np.ndarray
+    located: np.ndarray
+    rad_lats: np.ndarray = field(init=False, repr=False)
+    rad_lons: np.ndarray = field(init=False, repr=False)
+    cos_lats: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # Per-point parts of the haversine kernel, so a block only does the pairwise terms
+        self.rad_lats, self.rad_lons = np.radians(self.lats), np.radians(self.lons)
+        self.cos_lats = np.cos(self.rad_lats)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, mapping: dict, id_column: Optional[str] = None) -> "ScoringArrays":
+        type_col = mapping.get("property_type")
+        if type_col in df.columns:
+            types = df[type_col]
+            if not isinstance(types.dtype, pd.CategoricalDtype):
+                types = types.astype("category")
+            codes, categories = types.cat.codes.to_numpy().astype(np.int64), list(types.cat.categories)
+        else:
+            codes, categories = np.full(len(df), -1, dtype=np.int64), []
+        lats, lons = _float_column(df, "latitude"), _float_column(df, "longitude")
+        ids = df[id_column].to_numpy() if id_column else np.arange(len(df))
+        return cls(
+            ids=ids,
+            type_codes=codes,
+            types=get_type_similarity(categories),
+            lats=lats,
+            lons=lons,
+            sizes=_float_column(df, mapping.get("size")),
+            ages=_float_column(df, mapping.get("age")),
+            located=valid_coords(lats, lons),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _type_rows(self, codes: np.ndarray) -> np.ndarray:
+        categories = self.types.categories
+        return np.vstack([self.types.row(categories[c] if c >= 0 else np.nan) for c in codes])
+
+    def _haversine_km(self, subjects, candidates):
+        """utils.haversine_km between row positions, term for term."""
+        lat1, lat2 = self.rad_lats[subjects], self.rad_lats[candidates]
+        lon1, lon2 = self.rad_lons[subjects], self.rad_lons[candidates]
+        a = np.sin((lat2 - lat1) / 2) ** 2 + self.cos_lats[subjects] * self.cos_lats[candidates] * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    def components(self, subjects: np.ndarray, candidates: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Similarity components for subject/candidate row positions that broadcast against each
+        other: subjects[:, None] with candidates[None, :] gives a block matrix, equal shapes give pairs.
+        Same formulas as compute_similarity, with property types compared by code.
+        """
+        subject_codes, inverse = np.unique(self.type_codes[subjects], return_inverse=True)
+        type_rows = self._type_rows(subject_codes)
+        out = {"type": type_rows[inverse.reshape(np.shape(subjects)), self.type_codes[candidates]]}
+        located = self.located[subjects] & self.located[candidates]
+        with np.errstate(invalid="ignore"):
+            d = self._haversine_km(subjects, candidates)
+            out["location"] = np.where(located, np.exp(-np.where(located, d, 0.0) / 2.5), 0.0)
+            for name, values in (("size", self.sizes), ("age", self.ages)):
+                base = values[subjects]
+                sim = 1 - np.abs(base - values[candidates]) / np.maximum(base, 1)
+                out[name] = np.where(np.isnan(sim), 0.0, np.maximum(sim, 0.0))
+        return out
+
+
+def weighted_scores(components: Dict[str, np.ndarray], weights: dict) -> np.ndarray:
+    return round_scores(sum(weights[name] * components[name] for name in COMPONENTS))
+
+
+def _top_k(keys: np.ndarray, positions: np.ndarray, k: int):
+    """Per row, the k largest keys (and their positions), best first."""
+    if keys.shape[1] > k:
+        part = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+        keys, positions = np.take_along_axis(keys, part, 1), np.take_along_axis(positions, part, 1)
+    order = np.argsort(-keys, axis=1, kind="stable")
+    return np.take_along_axis(keys, order, 1), np.take_along_axis(positions, order, 1)
+
+
+def score_block(arrays: ScoringArrays, subjects: np.ndarray, weights: dict, top_n: int,
+                candidate_block: int = 8192, exclude_self: bool = True):
+    """
+    Top-n candidate positions and scores for a block of subjects. Candidates are scored in
+    column blocks as one subjects x candidates matrix each, keeping a running top-n with
+    argpartition. Ties go to the earlier row, as in find_comparables.
+    """
+    n = len(arrays)
+    k = min(top_n, n - 1 if exclude_self else n)
+    if k <= 0:
+        return np.empty((len(subjects), 0), dtype=np.int64), np.empty((len(subjects), 0))
+    best_keys = np.full((len(subjects), 0), -1, dtype=np.int64)
+    best_pos = np.empty((len(subjects), 0), dtype=np.int64)
+    for start in range(0, n, candidate_block):
+        candidates = np.arange(start, min(start + candidate_block, n))
+        scores = weighted_scores(arrays.components(subjects[:, None], candidates[None, :]), weights)
+        # Integer sort key: score (4 decimals) first, then the earlier row on ties
+        keys = np.rint(scores * 10_000).astype(np.int64) * (n + 1) + (n - candidates)[None, :]
+        if exclude_self:
+            keys[subjects[:, None] == candidates[None, :]] = -1
+        positions = np.broadcast_to(candidates, keys.shape)
+        best_keys, best_pos = _top_k(np.hstack([best_keys, keys]), np.hstack([best_pos, positions]), k)
+    return best_pos, np.rint(best_keys // (n + 1)) / 10_000
+
+
+_worker_state = {}
+
+
+def _init_worker(arrays, weights, top_n, candidate_block, exclude_self):
+    _worker_state.update(arrays=arrays, weights=weights, top_n=top_n,
+                         candidate_block=candidate_block, exclude_self=exclude_self)
+
+
+def _score_block_in_worker(subjects):
+    s = _worker_state
+    return score_block(s["arrays"], subjects, s["weights"], s["top_n"], s["candidate_block"], s["exclude_self"])
+
+
+def batch_comparables(
+    df: pd.DataFrame,
+    mapping: dict,
+    subject_ids: Optional[Sequence] = None,
+    id_column: Optional[str] = None,
+    weights: Optional[dict] = None,
+    top_n: int = 5,
+    workers: int = 1,
+    subject_block: int = 32,
+    candidate_block: int = 8192,
+    exclude_self: bool = True,
+    arrays: Optional[ScoringArrays] = None,
+) -> pd.DataFrame:
+    """
+    Top-n comparables for many subjects at once, as one long table with columns
+    subject_id, comp_id, rank, score and the four component scores.
+
+    Subjects are the rows whose `id_column` value is in `subject_ids` (all rows when None;
+    row positions serve as ids without an id column). Subject blocks are spread over
+    `workers` processes, each holding the scoring arrays once.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    arrays = arrays or ScoringArrays.from_frame(df, mapping, id_column)
+    if subject_ids is None:
+        subjects = np.arange(len(arrays))
+    else:
+        wanted = pd.Index([str(s) for s in subject_ids])
+        subjects = np.flatnonzero(pd.Index(arrays.ids.astype(str)).isin(wanted))
+    blocks = [subjects[i:i + subject_block] for i in range(0, len(subjects), subject_block)]
+
+    if workers > 1 and len(blocks) > 1:
+        # Every process copies the scoring arrays, so never start more than there are blocks
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks)), initializer=_init_worker,
+                                 initargs=(arrays, weights, top_n, candidate_block, exclude_self)) as pool:
+            results = list(pool.map(_score_block_in_worker, blocks))
+    else:
+        results = [score_block(arrays, block, weights, top_n, candidate_block, exclude_self) for block in blocks]
+
+    frames: List[pd.DataFrame] = []
+    for block, (positions, scores) in zip(blocks, results):
+        if not positions.size:
+            continue
+        subject_pos = np.repeat(block, positions.shape[1])
+        comp_pos = positions.ravel()
+        parts = arrays.components(subject_pos, comp_pos)
+        frame = {
+            "subject_id": arrays.ids[subject_pos],
+            "comp_id": arrays.ids[comp_pos],
+            "rank": np.tile(np.arange(1, positions.shape[1] + 1), len(block)),
+            "score": scores.ravel(),
+        }
+        frame.update({f"{name}_score": np.round(parts[name], 4) for name in COMPONENTS})
+        frames.append(pd.DataFrame(frame))
+    if not frames:
+        return pd.DataFrame(columns=["subject_id", "comp_id", "rank", "score"] + [f"{c}_score" for c in COMPONENTS])
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_batch_output(results: pd.DataFrame, path: str) -> str:
+    """Parquet when the path says so (and pyarrow is installed), CSV otherwise."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".parquet"):
+        try:
+            results.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = path[: -len(".parquet")] + ".csv"
+    results.to_csv(path, index=False)
+    return path
@@ -1,9 +1,15 @@
 import pandas as pd
 import numpy as np
-from utils import geo_distance_km
+from utils import haversine_km
+from spatial import valid_coords
+
+def is_missing_type(value) -> bool:
+    return value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value))
 
 def type_similarity(type1, type2):
     from difflib import SequenceMatcher
+    # A missing type (None from JSON, NaN from CSV/Parquet or a categorical) is no type at all, never the text "nan"
+    type1, type2 = ("" if is_missing_type(t) else t for t in (type1, type2))
     return SequenceMatcher(None, str(type1 or "").lower(), str(type2 or "").lower()).ratio()
 
 def size_similarity(size1, size2):
@@ -24,10 +30,13 @@ def age_similarity(age1, age2):
 
 def location_similarity(lat1, lon1, lat2, lon2, loc_scale_km=2.5):
     try:
-        d = geo_distance_km((lat1, lon1), (lat2, lon2))
+        lat1, lon1, lat2, lon2 = float(lat1), float(lon1), float(lat2), float(lon2)
+        if abs(lat1) > 90 or abs(lat2) > 90:
+            return 0.0
+        d = haversine_km(lat1, lon1, lat2, lon2)
         if np.isnan(d):
             return 0.0
-        return np.exp(-d / loc_scale_km)
+        return float(np.exp(-d / loc_scale_km))
     except Exception:
         return 0.0
 
@@ -44,14 +53,167 @@ def compute_similarity(subject: dict, candidate: dict, mapping: dict, weights: d
     score = (weights['type']*t_sim + weights['location']*loc_sim + weights['size']*sz_sim + weights['age']*ag_sim)
     return round(score, 4)
 
-def find_comparables(subject: dict, db: pd.DataFrame, mapping: dict, weights=None, top_n=5) -> list:
+# === Vectorized scoring (same formulas as above, applied to whole columns at once) ===
+
+def _column(db: pd.DataFrame, col) -> pd.Series:
+    """A candidate column, or all-missing values when the mapping has no such column."""
+    if col is not None and col in db.columns:
+        return db[col]
+    return pd.Series([None] * len(db), index=db.index, dtype=object)
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except Exception:
+        return np.nan
+
+def _float_array(values: pd.Series) -> np.ndarray:
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+class TypeSimilarityMatrix:
+    """
+    type_similarity between every pair of a dataset's distinct property types, so scoring a
+    dictionary-encoded type column is one lookup per row. Rows are filled the first time a
+    subject type is seen and kept; the last column is for missing types. `similarity` can be
+    swapped for a curated table lookup.
+    """
+
+    def __init__(self, categories, similarity=type_similarity):
+        self.categories = list(categories)
+        self.similarity = similarity
+        self._values = self.categories + [None]
+        self._codes = {c: i for i, c in enumerate(self.categories)}
+        self._rows = {}
+
+    def row(self, subject_type) -> np.ndarray:
+        """Similarity of subject_type to each category, then to a missing type."""
+        try:
+            if is_missing_type(subject_type):
+                key = ("missing",)
+            else:
+                key = ("code", self._codes[subject_type]) if subject_type in self._codes else ("value", subject_type)
+            cached = self._rows.get(key)
+        except TypeError:  # unhashable subject value
+            key, cached = None, None
+        if cached is None:
+            cached = np.array([self.similarity(subject_type, v) for v in self._values], dtype=float)
+            if key is not None:
+                self._rows[key] = cached
+        return cached
+
+    def scores(self, subject_type, codes: np.ndarray) -> np.ndarray:
+        # Missing values have code -1, which indexes the trailing missing-type column
+        return self.row(subject_type)[codes]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return np.vstack([self.row(c) for c in self.categories])
+
+_type_matrices = {}
+
+def get_type_similarity(categories, similarity=type_similarity) -> TypeSimilarityMatrix:
+    """One matrix per distinct category list (i.e. per dataset), reused across subjects."""
+    key = (tuple(categories), similarity)
+    if key not in _type_matrices:
+        _type_matrices[key] = TypeSimilarityMatrix(categories, similarity)
+    return _type_matrices[key]
+
+def type_similarity_array(subject_type, types: pd.Series) -> np.ndarray:
+    """type_similarity against every candidate, computed once per distinct type."""
+    if isinstance(types.dtype, pd.CategoricalDtype):
+        return get_type_similarity(types.cat.categories).scores(subject_type, types.cat.codes.to_numpy())
+    codes, uniques = pd.factorize(types)
+    # Missing values have code -1, which picks the trailing missing-type entry
+    table = np.array([type_similarity(subject_type, u) for u in uniques] + [type_similarity(subject_type, None)],
+                     dtype=float)
+    return table[codes]
+
+def ratio_similarity_array(subject_value, values: np.ndarray) -> np.ndarray:
+    """1 - |a - b| / max(a, 1), floored at 0; missing or unparseable values score 0 (size and age)."""
+    base = _as_float(subject_value)
+    if np.isnan(base):
+        return np.zeros(len(values))
+    with np.errstate(invalid="ignore"):
+        sim = 1 - np.abs(base - values) / max(base, 1)
+    return np.where(np.isnan(sim), 0.0, np.maximum(sim, 0.0))
+
+def location_similarity_array(subject_lat, subject_lon, lats: np.ndarray, lons: np.ndarray, loc_scale_km=2.5) -> np.ndarray:
+    lat1, lon1 = _as_float(subject_lat), _as_float(subject_lon)
+    if not valid_coords(lat1, lon1):
+        return np.zeros(len(lats))
+    valid = valid_coords(lats, lons)
+    d = haversine_km(lat1, lon1, lats, lons)
+    return np.where(valid, np.exp(-np.where(valid, d, 0.0) / loc_scale_km), 0.0)
+
+def similarity_components(subject: dict, db: pd.DataFrame, mapping: dict) -> dict:
+    """Per-candidate type/location/size/age similarity arrays for one subject."""
+    return {
+        "type": type_similarity_array(subject.get(mapping["property_type"]), _column(db, mapping["property_type"])),
+        "location": location_similarity_array(subject.get("latitude"), subject.get("longitude"),
+                                              _float_array(_column(db, "latitude")),
+                                              _float_array(_column(db, "longitude"))),
+        "size": ratio_similarity_array(subject.get(mapping["size"]), _float_array(_column(db, mapping["size"]))),
+        "age": ratio_similarity_array(subject.get(mapping["age"]), _float_array(_column(db, mapping["age"]))),
+    }
+
+def weighted_score(components: dict, weights: dict) -> np.ndarray:
+    score = (weights['type']*components["type"] + weights['location']*components["location"]
+             + weights['size']*components["size"] + weights['age']*components["age"])
+    return round_scores(score)
+
+def round_scores(score: np.ndarray, digits: int = 4) -> np.ndarray:
+    """round(x, 4) per element: np.round is one unit off on some near-half values, so those are redone exactly."""
+    score = np.asarray(score, dtype=float)
+    rounded = np.round(score, digits)
+    scaled = score * 10 ** digits
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(float(x), digits) for x in score[near_half]]
+    return rounded
+
+def top_n_indices(scores: np.ndarray, top_n: int) -> np.ndarray:
+    """Positions of the top_n scores, best first; ties keep row order (like a stable sort)."""
+    if top_n <= 0:
+        return np.array([], dtype=int)
+    if top_n >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    kth = np.partition(scores, len(scores) - top_n)[len(scores) - top_n]
+    above = np.flatnonzero(scores > kth)
+    tied = np.flatnonzero(scores == kth)[:top_n - len(above)]
+    picked = np.sort(np.concatenate([above, tied]))
+    return picked[np.argsort(-scores[picked], kind="stable")]
+
+def candidate_positions(subject: dict, index, radius_km=None, k_nearest=None):
+    """
+    Row positions worth scoring for a subject: within radius_km and/or its k_nearest by distance.
+    None means "score everything" (no index, no limits, or a subject without usable coordinates).
+    """
+    if index is None or (radius_km is None and k_nearest is None):
+        return None
+    lat, lon = _as_float(subject.get("latitude")), _as_float(subject.get("longitude"))
+    if not valid_coords(lat, lon):
+        return None
+    if k_nearest is not None:
+        return index.nearest(lat, lon, k_nearest, max_radius_km=radius_km)
+    return index.within(lat, lon, radius_km)
+
+def find_comparables(subject: dict, db: pd.DataFrame, mapping: dict, weights=None, top_n=5,
+                     index=None, radius_km=None, k_nearest=None) -> list:
+    """
+    Top comparables for one subject. With a SpatialIndex over `db` and a radius_km and/or
+    k_nearest limit, only those nearby candidates are scored instead of the whole frame.
+    """
     if weights is None:
         weights = {'type':0.35, 'location':0.35, 'size':0.2, 'age':0.1}
+    positions = candidate_positions(subject, index, radius_km, k_nearest)
+    if positions is not None:
+        db = db.iloc[positions]
+    if db.empty:
+        return []
+    scores = weighted_score(similarity_components(subject, db, mapping), weights)
     comparables = []
-    for _, row in db.iterrows():
-        candidate = row.to_dict()
-        score = compute_similarity(subject, candidate, mapping, weights)
-        candidate['comparable_score'] = score
+    for i in top_n_indices(scores, top_n):
+        candidate = db.iloc[i].to_dict()
+        candidate['comparable_score'] = float(scores[i])
         comparables.append(candidate)
-    comparables.sort(key=lambda c: c['comparable_score'], reverse=True)
-    return comparables[:top_n]
+    return comparables
@@ -0,0 +1,291 @@
+"""
+Materialized top-k comparables for every property, stored on disk by version.
+
+`build` scores the whole dataset once (phase3/batch.py). `update` compares the
+dataset against the per-property fingerprints saved with the current version
+and recomputes only the subjects whose comps can have changed:
+  - properties that were added or changed,
+  - subjects that list a changed or removed property among their comps,
+  - subjects for which an added or changed property now scores at least as
+    high as their current k-th comp (its spatial/type neighbourhood changed).
+Everything else is carried over, so a small Phase 1/Phase 2 delta costs
+N x changed scores instead of N x N.
+
+Each build or update writes a new versions/vNNNN directory and flips
+manifest.json to it; `status` reports how old the current version is and
+whether the source file (or a given dataset) has moved on since.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import file_signature, load_scoring_frame, prepare_scoring_columns
+from batch import COMPONENTS, DEFAULT_WEIGHTS, ScoringArrays, batch_comparables, weighted_scores, write_batch_output
+
+TABLE_DIR = os.path.join("data", "comparables")
+
+
+def property_fingerprints(df: pd.DataFrame, mapping: dict, id_column: str) -> pd.Series:
+    """Hash of every scored attribute per property id; a different hash means the property changed."""
+    columns = [c for c in dict.fromkeys([mapping.get("property_type"), mapping.get("size"), mapping.get("age"),
+                                          "latitude", "longitude"]) if c and c in df.columns]
+    scored = df[columns].astype(object)
+    hashes = pd.util.hash_pandas_object(scored, index=False).to_numpy()
+    return pd.Series(hashes.astype(np.uint64), index=df[id_column].astype(str).to_numpy())
+
+
+def _sorted_by_id(df: pd.DataFrame, id_column: str) -> pd.DataFrame:
+    # Row order breaks score ties, so order by id to keep ties stable from one version to the next
+    df = df.assign(**{id_column: df[id_column].astype(str)})
+    return df.sort_values(id_column, kind="stable").reset_index(drop=True)
+
+
+def _read_table(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype={"subject_id": str, "comp_id": str, "id": str})
+
+
+class ComparablesTable:
+    def __init__(self, table_dir: str = TABLE_DIR, keep_versions: int = 5):
+        self.table_dir = table_dir
+        self.manifest_path = os.path.join(table_dir, "manifest.json")
+        self.keep_versions = keep_versions
+        self.manifest = self._load_manifest()
+        self._comps: Optional[pd.DataFrame] = None
+
+    # --- manifest and snapshots ---
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {"current": None, "versions": []}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    @property
+    def current(self) -> Optional[dict]:
+        for entry in self.manifest["versions"]:
+            if entry["version"] == self.manifest["current"]:
+                return entry
+        return None
+
+    def _write_version(self, comps: pd.DataFrame, fingerprints: pd.Series, info: dict) -> dict:
+        version = (self.manifest["current"] or 0) + 1
+        final_dir = os.path.join(self.table_dir, "versions", f"v{version:04d}")
+        tmp_dir = final_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        comps = comps.sort_values(["subject_id", "rank"], kind="stable").reset_index(drop=True)
+        comps_file = os.path.basename(write_batch_output(comps, os.path.join(tmp_dir, "comps.parquet")))
+        state = pd.DataFrame({"id": fingerprints.index, "fingerprint": fingerprints.to_numpy().astype(str)})
+        state_file = os.path.basename(write_batch_output(state, os.path.join(tmp_dir, "state.parquet")))
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+
+        entry = {"version": version, "created_at": time.time(), "comps": comps_file, "state": state_file,
+                 "subjects": int(comps["subject_id"].nunique()), "rows": len(comps), **info}
+        self.manifest["versions"].append(entry)
+        self.manifest["current"] = version
+        self._save_manifest()
+        self._comps = None
+        self._prune()
+        return entry
+
+    def _version_dir(self, version: int) -> str:
+        return os.path.join(self.table_dir, "versions", f"v{version:04d}")
+
+    def _prune(self):
+        kept = self.manifest["versions"][-self.keep_versions:]
+        for entry in self.manifest["versions"][:-self.keep_versions]:
+            shutil.rmtree(self._version_dir(entry["version"]), ignore_errors=True)
+        if len(kept) != len(self.manifest["versions"]):
+            self.manifest["versions"] = kept
+            self._save_manifest()
+
+    def load(self, version: Optional[int] = None) -> pd.DataFrame:
+        """A version's comps (default: current), indexed by subject_id."""
+        version = version or self.manifest["current"]
+        entry = next((e for e in self.manifest["versions"] if e["version"] == version), None)
+        if entry is None:
+            raise FileNotFoundError(f"No comparables table version {version} in {self.table_dir}")
+        comps = _read_table(os.path.join(self._version_dir(version), entry["comps"]))
+        comps = comps.assign(subject_id=comps["subject_id"].astype(str), comp_id=comps["comp_id"].astype(str))
+        return comps.set_index("subject_id").sort_index()
+
+    def _state(self, entry: dict) -> pd.Series:
+        state = _read_table(os.path.join(self._version_dir(entry["version"]), entry["state"]))
+        return pd.Series(state["fingerprint"].astype(str).to_numpy(), index=state["id"].astype(str).to_numpy())
+
+    def comps_for(self, subject_id) -> pd.DataFrame:
+        """Top comps of one property from the current version (the table is read once and kept)."""
+        if self._comps is None:
+            self._comps = self.load()
+        key = str(subject_id)
+        if key not in self._comps.index:
+            return self._comps.iloc[0:0].reset_index()
+        return self._comps.loc[[key]].reset_index()
+
+    # --- building ---
+
+    def build(self, df: pd.DataFrame, mapping: dict, id_column: str, top_n: int = 10, weights: Optional[dict] = None,
+              workers: int = 1, source: Optional[str] = None) -> dict:
+        """Full N x N computation into a new version."""
+        if not id_column:
+            raise ValueError("A materialized comparables table needs an id column")
+        started = time.monotonic()
+        weights = weights or DEFAULT_WEIGHTS
+        df = _sorted_by_id(df, id_column)
+        comps = batch_comparables(df, mapping, None, id_column=id_column, weights=weights, top_n=top_n,
+                                  workers=workers)
+        info = {"mode": "full", "recomputed": int(len(df)), "top_n": top_n, "weights": weights,
+                "id_column": id_column, "source": source, "source_signature": _signature(source),
+                "seconds": round(time.monotonic() - started, 2)}
+        return self._write_version(comps, property_fingerprints(df, mapping, id_column), info)
+
+    def changes(self, df: pd.DataFrame, mapping: dict, id_column: str) -> dict:
+        """Ids added, changed and removed in df relative to the current version."""
+        previous = self._state(self.current)
+        now = property_fingerprints(df, mapping, id_column).astype(str)
+        common = now.index.intersection(previous.index)
+        return {
+            "added": now.index.difference(previous.index).tolist(),
+            "changed": common[now.loc[common].to_numpy() != previous.loc[common].to_numpy()].tolist(),
+            "removed": previous.index.difference(now.index).tolist(),
+        }
+
+    def update(self, df: pd.DataFrame, mapping: dict, id_column: Optional[str] = None, workers: int = 1,
+               source: Optional[str] = None, full_rebuild_share: float = 0.25, subject_block: int = 8192) -> dict:
+        """
+        Bring the table up to date with df, recomputing only affected subjects. Falls back to a
+        full build without a current version, after a change of id column, or when more than
+        full_rebuild_share of the properties changed.
+        """
+        current = self.current
+        id_column = id_column or (current or {}).get("id_column")
+        if current is None or id_column != current.get("id_column"):
+            return self.build(df, mapping, id_column, workers=workers, source=source)
+        top_n, weights = current["top_n"], current["weights"]
+        started = time.monotonic()
+        df = _sorted_by_id(df, id_column)
+        delta = self.changes(df, mapping, id_column)
+        touched = delta["added"] + delta["changed"]
+        if len(touched) + len(delta["removed"]) > full_rebuild_share * max(len(df), 1):
+            return self.build(df, mapping, id_column, top_n=top_n, weights=weights, workers=workers, source=source)
+
+        previous = self.load(current["version"]).reset_index()
+        gone = set(delta["changed"]) | set(delta["removed"])
+        affected = set(touched)
+        affected |= set(previous.loc[previous["comp_id"].isin(gone), "subject_id"])
+
+        # Subjects an added/changed property now reaches: it scores at least their current k-th comp
+        arrays = ScoringArrays.from_frame(df, mapping, id_column)
+        ids = arrays.ids.astype(str)
+        counts = previous.groupby("subject_id")["score"].agg(["size", "min"])
+        full = counts.loc[counts["size"] >= top_n, "min"]
+        threshold = full.reindex(ids).fillna(-np.inf).to_numpy()
+        candidates = np.flatnonzero(pd.Index(ids).isin(touched))
+        if len(candidates):
+            for start in range(0, len(ids), subject_block):
+                subjects = np.arange(start, min(start + subject_block, len(ids)))
+                scores = weighted_scores(arrays.components(subjects[:, None], candidates[None, :]), weights)
+                scores[subjects[:, None] == candidates[None, :]] = -np.inf
+                reached = (scores >= threshold[subjects, None]).any(axis=1)
+                affected |= set(ids[subjects[reached]])
+
+        affected -= set(delta["removed"])
+        recomputed = batch_comparables(df, mapping, sorted(affected), id_column=id_column, weights=weights,
+                                       top_n=top_n, workers=workers, arrays=arrays) if affected else None
+        kept = previous[~previous["subject_id"].isin(affected | set(delta["removed"]))]
+        comps = pd.concat([kept, recomputed], ignore_index=True) if recomputed is not None else kept
+        info = {"mode": "incremental", "recomputed": len(affected), "added": len(delta["added"]),
+                "changed": len(delta["changed"]), "removed": len(delta["removed"]), "top_n": top_n,
+                "weights": weights, "id_column": id_column, "source": source,
+                "source_signature": _signature(source), "seconds": round(time.monotonic() - started, 2)}
+        return self._write_version(comps[["subject_id", "comp_id", "rank", "score"] + [f"{c}_score" for c in COMPONENTS]],
+                                   property_fingerprints(df, mapping, id_column), info)
+
+    # --- staleness ---
+
+    def status(self, df: Optional[pd.DataFrame] = None, mapping: Optional[dict] = None) -> dict:
+        """How old the current version is, whether its source file changed since, and (given df) by how much."""
+        current = self.current
+        if current is None:
+            return {"version": None, "stale": True, "reason": "no table built yet"}
+        report = {
+            "version": current["version"],
+            "mode": current["mode"],
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(current["created_at"])),
+            "age_seconds": round(time.time() - current["created_at"], 1),
+            "subjects": current["subjects"],
+            "versions_kept": [e["version"] for e in self.manifest["versions"]],
+        }
+        source = current.get("source")
+        if source:
+            signature = _signature(source)
+            report["source_changed"] = signature != current.get("source_signature")
+            if signature and report["source_changed"]:
+                report["source_newer_by_seconds"] = round(signature[0] / 1e9 - current["created_at"], 1)
+        if df is not None and mapping is not None:
+            delta = self.changes(_sorted_by_id(df, current["id_column"]), mapping, current["id_column"])
+            report["pending"] = {k: len(v) for k, v in delta.items()}
+        report["stale"] = bool(report.get("source_changed") or any((report.get("pending") or {}).values()))
+        return report
+
+
+def _signature(path: Optional[str]):
+    if not path or not os.path.exists(path):
+        return None
+    return list(file_signature(path))
+
+
+def load_dataset(path: str, id_column: str):
+    df, mapping = load_scoring_frame(path, extra_columns=[id_column])
+    if id_column not in df.columns:
+        raise ValueError(f"Id column '{id_column}' not found in {path}")
+    return prepare_scoring_columns(df, mapping)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialized top-k comparables table")
+    parser.add_argument("command", choices=["build", "update", "status", "show"])
+    parser.add_argument("filepath", nargs="?", help="Processed dataset (required for build/update)")
+    parser.add_argument("--id-column", help="Column holding property ids (required for build)")
+    parser.add_argument("--top-n", type=int, default=10, help="Comparables kept per property (build)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scoring processes")
+    parser.add_argument("--table-dir", default=TABLE_DIR)
+    parser.add_argument("--subject", help="With show: property id to print comps for")
+    args = parser.parse_args()
+
+    table = ComparablesTable(args.table_dir)
+    if args.command in ("build", "update"):
+        id_column = args.id_column or (table.current or {}).get("id_column")
+        if not args.filepath or not id_column:
+            parser.error(f"{args.command} needs a dataset path and --id-column")
+        df, mapping = load_dataset(args.filepath, id_column)
+        if args.command == "build":
+            entry = table.build(df, mapping, id_column, top_n=args.top_n, workers=args.workers, source=args.filepath)
+        else:
+            entry = table.update(df, mapping, id_column, workers=args.workers, source=args.filepath)
+        print(f"→ Version {entry['version']} ({entry['mode']}): {entry['recomputed']} subjects recomputed "
+              f"in {entry['seconds']}s, {entry['rows']} comps")
+    elif args.command == "status":
+        df = mapping = None
+        current = table.current
+        if args.filepath and current:
+            df, mapping = load_dataset(args.filepath, current["id_column"])
+        print(json.dumps(table.status(df, mapping), indent=2))
+    else:
+        if not args.subject:
+            parser.error("show needs --subject")
+        print(table.comps_for(args.subject).to_string(index=False))
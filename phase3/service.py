@@ -0,0 +1,291 @@
+"""
+Long-running comparables query service.
+
+Loads a processed dataset once and keeps the column mapping, the coerced
+numeric columns, the dictionary-encoded types and the spatial index warm in
+memory, then answers comps queries over HTTP on localhost. The file is
+watched and reloaded in the background when it changes; queries keep being
+served from the previous snapshot until the new one is ready.
+
+    python phase3/service.py data/processed/processed_data.parquet --id-column pin
+
+    GET  /health
+    GET  /comparables?subject_id=P123&top_n=5
+    POST /comparables  {"subject_id": "P123"} or {"subject": {...attributes...}},
+                       plus optional top_n, weights, radius_km, k_nearest
+    POST /reload
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import Request, urlopen
+
+import numpy as np
+import pandas as pd
+
+from utils import file_signature, load_scoring_frame, prepare_scoring_columns
+from comparable import find_comparables
+from spatial import SpatialIndex
+from batch import DEFAULT_WEIGHTS
+from common.events import get_event_log
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+ROW_ID_COLUMN = "row_id"
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+@dataclass
+class Snapshot:
+    """One loaded version of the dataset with everything a query needs."""
+    df: pd.DataFrame
+    mapping: dict
+    source_mapping: dict
+    id_column: str
+    positions: dict
+    index: SpatialIndex
+    signature: tuple
+    version: int
+    loaded_at: float
+    load_seconds: float
+
+    @classmethod
+    def load(cls, path: str, id_column: Optional[str] = None, version: int = 1) -> "Snapshot":
+        started = time.monotonic()
+        signature = file_signature(path)
+        df, mapping = load_scoring_frame(path, extra_columns=[id_column] if id_column else None)
+        source_mapping = dict(mapping)
+        df, mapping = prepare_scoring_columns(df, mapping)
+        if id_column and id_column not in df.columns:
+            raise ValueError(f"Id column '{id_column}' not found in {path}")
+        if not id_column:
+            id_column = ROW_ID_COLUMN
+            df[id_column] = np.arange(len(df))
+        # Ids are matched as strings so query-string and JSON ids both resolve
+        positions = {str(v): i for i, v in enumerate(df[id_column].to_numpy())}
+        return cls(df=df, mapping=mapping, source_mapping=source_mapping, id_column=id_column, positions=positions,
+                   index=SpatialIndex.from_frame(df), signature=signature, version=version,
+                   loaded_at=time.time(), load_seconds=round(time.monotonic() - started, 3))
+
+    def prepare_subject(self, subject: dict) -> dict:
+        """An ad-hoc subject with the columns the loaded rows were scored on (e.g. an age from its year built)."""
+        frame = pd.DataFrame([subject])
+        missing = [c for c in self.source_mapping.values() if c and c not in frame.columns]
+        frame = frame.assign(**{c: np.nan for c in missing})
+        frame, _ = prepare_scoring_columns(frame, dict(self.source_mapping))
+        prepared = frame.drop(columns=missing).iloc[0].to_dict()
+        # A derived column passed directly (e.g. __computed_age without a year) is kept as given
+        for col in set(self.mapping.values()) - set(self.source_mapping.values()):
+            if col in subject and pd.isna(prepared.get(col)):
+                prepared[col] = subject[col]
+        return prepared
+
+    def query(self, subject_id=None, subject: Optional[dict] = None, top_n: int = 5, weights: Optional[dict] = None,
+              radius_km: Optional[float] = None, k_nearest: Optional[int] = None) -> dict:
+        if subject_id is not None:
+            position = self.positions.get(str(subject_id))
+            if position is None:
+                raise KeyError(f"Unknown subject_id {subject_id!r}")
+            subject = self.df.iloc[position].to_dict()
+        elif not subject:
+            raise ValueError("Provide subject_id or subject")
+        else:
+            subject = self.prepare_subject(subject)
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        # One extra so the subject itself can be dropped from its own comps
+        comps = find_comparables(subject, self.df, self.mapping, weights, top_n=top_n + 1,
+                                 index=self.index, radius_km=radius_km, k_nearest=k_nearest)
+        if subject_id is not None:
+            comps = [c for c in comps if str(c.get(self.id_column)) != str(subject_id)]
+        comps = comps[:top_n]
+        return {
+            "subject": {k: _jsonable(v) for k, v in subject.items()},
+            "comparables": [{k: _jsonable(v) for k, v in c.items()} for c in comps],
+            "version": self.version,
+        }
+
+
+class ComparablesService:
+    """Holds the current snapshot and swaps in a fresh one whenever the dataset file changes."""
+
+    def __init__(self, path: str, id_column: Optional[str] = None, poll_interval: float = 2.0):
+        self.path = path
+        self.id_column = id_column
+        self.poll_interval = poll_interval
+        self.snapshot = Snapshot.load(path, id_column)
+        self.queries = 0
+        self.reload_errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name="comps-reload", daemon=True)
+
+    def start_watching(self):
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if file_signature(self.path) != self.snapshot.signature:
+                    self.reload()
+            except OSError:
+                continue  # file briefly missing while it is being replaced
+
+    def reload(self) -> dict:
+        """Load the dataset again; on failure the previous snapshot keeps serving."""
+        with self._lock:
+            current = self.snapshot
+            try:
+                snapshot = Snapshot.load(self.path, self.id_column, version=current.version + 1)
+            except Exception as e:
+                self.reload_errors += 1
+                # Do not retry the same broken file on every poll
+                current.signature = file_signature(self.path)
+                get_event_log().error("service", f"Reload of {self.path} failed: {e}", error=e)
+                return {"reloaded": False, "error": str(e), "version": current.version}
+            self.snapshot = snapshot
+            print(f"→ Reloaded {self.path}: {len(snapshot.df)} rows in {snapshot.load_seconds}s (v{snapshot.version})")
+            return {"reloaded": True, "version": snapshot.version}
+
+    def health(self) -> dict:
+        s = self.snapshot
+        return {"path": self.path, "rows": len(s.df), "mapping": s.mapping, "id_column": s.id_column,
+                "version": s.version, "loaded_at": s.loaded_at, "load_seconds": s.load_seconds,
+                "queries": self.queries, "reload_errors": self.reload_errors}
+
+    def query(self, **params) -> dict:
+        self.queries += 1
+        return self.snapshot.query(**params)
+
+
+def _query_params(raw: dict) -> dict:
+    params = {"subject_id": raw.get("subject_id"), "subject": raw.get("subject"),
+              "top_n": int(raw.get("top_n", 5)), "weights": raw.get("weights")}
+    if raw.get("radius_km") is not None:
+        params["radius_km"] = float(raw["radius_km"])
+    if raw.get("k_nearest") is not None:
+        params["k_nearest"] = int(raw["k_nearest"])
+    return params
+
+
+def make_handler(service: ComparablesService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _answer(self, raw: dict):
+            started = time.monotonic()
+            try:
+                result = service.query(**_query_params(raw))
+            except KeyError as e:
+                return self._send(404, {"error": e.args[0]})
+            except (ValueError, TypeError) as e:
+                return self._send(400, {"error": str(e)})
+            result["ms"] = round((time.monotonic() - started) * 1000, 2)
+            self._send(200, result)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/health":
+                return self._send(200, service.health())
+            if url.path == "/comparables":
+                return self._answer({k: v[-1] for k, v in parse_qs(url.query).items()})
+            self._send(404, {"error": f"No route {url.path}"})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path == "/reload":
+                return self._send(200, service.reload())
+            if url.path != "/comparables":
+                return self._send(404, {"error": f"No route {url.path}"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                return self._send(400, {"error": f"Invalid JSON body: {e}"})
+            self._answer(raw if isinstance(raw, dict) else {})
+
+        def log_message(self, format, *args):
+            pass  # one line per query would drown the reload messages
+
+    return Handler
+
+
+def serve(path: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, id_column: Optional[str] = None,
+          poll_interval: float = 2.0):
+    """Build the service and an HTTP server for it (not yet serving; call serve_forever())."""
+    service = ComparablesService(path, id_column=id_column, poll_interval=poll_interval)
+    service.start_watching()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return service, server
+
+
+class ComparablesClient:
+    """Minimal client for the service, using only the standard library."""
+
+    def __init__(self, base_url: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, path: str, payload: Optional[dict] = None) -> dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = Request(self.base_url + path, data=data, headers={"Content-Type": "application/json"},
+                          method="POST" if data is not None else "GET")
+        with urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def health(self) -> dict:
+        return self._call("/health")
+
+    def reload(self) -> dict:
+        return self._call("/reload", {})
+
+    def comparables(self, subject_id=None, subject: Optional[dict] = None, top_n: int = 5, **options) -> dict:
+        payload = {"subject_id": subject_id, "subject": subject, "top_n": top_n}
+        payload.update({k: v for k, v in options.items() if v is not None})
+        return self._call("/comparables", payload)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve comparable-property queries from a warm in-memory index")
+    parser.add_argument("filepath", help="Processed dataset (Parquet, CSV, JSON, GeoJSON)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--id-column", help="Column holding property ids (default: row number)")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between checks for a changed dataset file")
+    args = parser.parse_args()
+
+    service, server = serve(args.filepath, args.host, args.port, args.id_column, args.poll)
+    snapshot = service.snapshot
+    print(f"→ Loaded {len(snapshot.df)} rows in {snapshot.load_seconds}s; mapping {snapshot.mapping}")
+    print(f"→ Serving comparables on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
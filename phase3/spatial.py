@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils import EARTH_RADIUS_KM, haversine_km
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def valid_coords(lat, lon):
+    """Coordinates comparable scoring can use: finite, non-zero (0 means missing in the source data), |lat| <= 90."""
+    return np.isfinite(lat) & np.isfinite(lon) & (lat != 0) & (lon != 0) & (np.abs(lat) <= 90)
+
+
+class SpatialIndex:
+    """
+    Uniform lat/lon grid over a dataset's coordinates, built once and reused for every query.
+
+    Points are bucketed into cells at least `cell_km` wide and sorted by cell, so
+    each grid row of a query window is one contiguous slice found by binary search.
+    A radius query touches only the cells around the subject and then filters by
+    exact haversine distance, so its cost follows local density rather than the
+    dataset size. Rows without usable coordinates are never returned.
+    """
+
+    def __init__(self, lats, lons, cell_km: float = 2.0):
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        self.cell_km = cell_km
+        self.positions = np.flatnonzero(valid_coords(lats, lons))
+        self.lats = lats[self.positions]
+        self.lons = lons[self.positions]
+        if not len(self.positions):
+            self.lat0 = self.lon0 = 0.0
+            self.dlat = self.dlon = 1.0
+            self.rows = self.cols = 1
+            self.keys = np.array([], dtype=np.int64)
+            return
+        # Longitude cells are sized at the highest latitude present, so no cell is narrower than cell_km
+        max_abs_lat = min(float(np.abs(self.lats).max()), 89.0)
+        self.dlat = cell_km / KM_PER_DEGREE
+        self.dlon = cell_km / (KM_PER_DEGREE * math.cos(math.radians(max_abs_lat)))
+        self.lat0, self.lon0 = float(self.lats.min()), float(self.lons.min())
+        self.rows = int((self.lats.max() - self.lat0) // self.dlat) + 1
+        self.cols = int((self.lons.max() - self.lon0) // self.dlon) + 1
+        keys = self._row(self.lats) * self.cols + self._col(self.lons)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.positions, self.lats, self.lons = self.positions[order], self.lats[order], self.lons[order]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, lat_col: str = "latitude", lon_col: str = "longitude", cell_km: float = 2.0):
+        def column(col):
+            if col not in df.columns:
+                return np.full(len(df), np.nan)
+            return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        return cls(column(lat_col), column(lon_col), cell_km=cell_km)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _row(self, lat):
+        return ((np.asarray(lat) - self.lat0) // self.dlat).astype(np.int64)
+
+    def _col(self, lon):
+        return ((np.asarray(lon) - self.lon0) // self.dlon).astype(np.int64)
+
+    def _slots(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Sorted-array slots of every point in the cells a radius_km circle around (lat, lon) can reach."""
+        reach_lat = radius_km / KM_PER_DEGREE
+        edge_lat = min(abs(lat) + reach_lat, 89.0)
+        reach_lon = radius_km / (KM_PER_DEGREE * math.cos(math.radians(edge_lat)))
+        row0 = max(int((lat - reach_lat - self.lat0) // self.dlat), 0)
+        row1 = min(int((lat + reach_lat - self.lat0) // self.dlat), self.rows - 1)
+        col0 = max(int((lon - reach_lon - self.lon0) // self.dlon), 0)
+        col1 = min(int((lon + reach_lon - self.lon0) // self.dlon), self.cols - 1)
+        if row0 > row1 or col0 > col1:
+            return np.array([], dtype=np.int64)
+        rows = np.arange(row0, row1 + 1, dtype=np.int64)
+        starts = np.searchsorted(self.keys, rows * self.cols + col0, side="left")
+        ends = np.searchsorted(self.keys, rows * self.cols + col1, side="right")
+        if not len(starts):
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+    def within(self, lat: float, lon: float, radius_km: float, with_distance: bool = False):
+        """Row positions (ascending) of points within radius_km of (lat, lon)."""
+        slots = self._slots(lat, lon, radius_km)
+        d = haversine_km(lat, lon, self.lats[slots], self.lons[slots])
+        keep = d <= radius_km
+        positions, d = self.positions[slots[keep]], d[keep]
+        order = np.argsort(positions)
+        return (positions[order], d[order]) if with_distance else positions[order]
+
+    def nearest(self, lat: float, lon: float, k: int, max_radius_km: float = None) -> np.ndarray:
+        """Row positions (ascending) of the k points nearest (lat, lon), optionally no further than max_radius_km."""
+        if k <= 0 or not len(self):
+            return np.array([], dtype=np.int64)
+        radius = self.cell_km
+        while True:
+            if max_radius_km is not None:
+                radius = min(radius, max_radius_km)
+            positions, d = self.within(lat, lon, radius, with_distance=True)
+            if len(positions) >= min(k, len(self)) or (max_radius_km is not None and radius >= max_radius_km):
+                break
+            radius *= 2
+        if len(positions) > k:
+            keep = np.argpartition(d, k - 1)[:k]
+            positions = np.sort(positions[keep])
+        return positions
@@ -1,30 +1,52 @@
+import numpy as np
 import pandas as pd
-import json
-from io import StringIO
-from langchain_openai import ChatOpenAI
-
-def load_data_from_file(filepath: str) -> pd.DataFrame:
-    """Loads CSV, JSON, or GeoJSON as DataFrame."""
-    if filepath.lower().endswith(".csv"):
-        return pd.read_csv(filepath)
-    with open(filepath, "r", encoding="utf-8") as f:
-        text = f.read()
+import os
+import sys
+
+# Repo root on sys.path so the shared `common` package resolves when run as a script
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+from common.field_mapping import get_mapper, llm_resolve_roles
+from common.streaming import detect_format, read_frame, read_sample
+
+def load_data_from_file(filepath: str, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Loads CSV, JSON, NDJSON, GeoJSON, or Parquet as DataFrame, parsed incrementally in bounded chunks.
+    `columns` prunes what is read; `filters` ([(column, op, value)]) are pushed down into Parquet reads.
+    """
     try:
-        data = json.loads(text)
-        if isinstance(data, dict) and data.get("type") == "FeatureCollection":
-            features = data.get("features", [])
-            records = [feat.get("properties", {}) for feat in features if "properties" in feat]
-            return pd.DataFrame(records)
-        if isinstance(data, list):
-            return pd.DataFrame(data)
-        if isinstance(data, dict):
-            return pd.DataFrame.from_dict(data)
-    except Exception:   
-        pass
+        return read_frame(filepath, columns=columns, filters=filters)
+    except Exception as e:
+        raise ValueError(f"Could not parse file '{filepath}' as CSV, JSON, or GeoJSON.") from e
+
+def load_scoring_frame(filepath: str, property_types=None, extra_columns=None):
+    """
+    Infer the column mapping from a small sample, then read only the columns comparables are
+    scored on. With `property_types`, Parquet row groups and partitions of other types are skipped.
+    The property type column is dictionary-encoded (categorical) so type similarity is scored per
+    distinct type rather than per row. `extra_columns` (e.g. a property id) are read as well.
+    """
     try:
-        return pd.read_csv(StringIO(text))
-    except Exception:
-        raise ValueError(f"Could not parse file '{filepath}' as CSV, JSON, or GeoJSON.")
+        sample = read_sample(filepath)
+    except Exception as e:
+        raise ValueError(f"Could not parse file '{filepath}' as CSV, JSON, GeoJSON, or Parquet.") from e
+    mapping = infer_column_mapping(sample)
+    wanted = list(mapping.values()) + ["latitude", "longitude"] + list(extra_columns or [])
+    columns = [c for c in dict.fromkeys(wanted) if c in sample.columns]
+    filters = None
+    if property_types and mapping.get("property_type"):
+        filters = [(mapping["property_type"], "in", list(property_types))]
+    if detect_format(filepath) == "parquet":
+        df = load_data_from_file(filepath, columns=columns, filters=filters)
+    else:
+        df = load_data_from_file(filepath, columns=columns)
+        if filters:
+            df = df[df[mapping["property_type"]].isin(property_types)].reset_index(drop=True)
+    type_col = mapping.get("property_type")
+    if type_col in df.columns and not isinstance(df[type_col].dtype, pd.CategoricalDtype):
+        df[type_col] = df[type_col].astype("category")
+    return df, mapping
 
 def get_llm_text_response(response):
     if hasattr(response, "content"):
@@ -33,46 +55,60 @@ def get_llm_text_response(response):
         return str(response)
 
 def infer_column_mapping(df):
-    llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+    """Resolve property_type/size/age/address columns locally; unresolved ones go to the LLM in one call."""
     sample = df.head(5).to_dict(orient="records")
-    columns = list(df.columns)
-    prompt = (
-        "These are the columns in a real estate dataset:\n"
-        f"{columns}\n\n"
-        "Here are a few sample rows:\n"
-        f"{json.dumps(sample, indent=2)}\n\n"
-        "Which columns best match the following logical fields (return as JSON, use null if missing):\n"
-        '{"property_type": , "size": , "age": , "address": }\n'
-        "property_type = column for type or use (e.g., industrial, office, etc)\n"
-        "size = building size in square feet.\n"
-        "age = property age or year built column\n"
-        "address = a field with an address or property description."
+    mapping = get_mapper().resolve_roles(
+        list(df.columns), ["property_type", "size", "age", "address"], sample, llm_fallback=llm_resolve_roles
     )
-    response = llm.invoke(prompt)
-    response_text = get_llm_text_response(response).strip()
-    
-    # --- ROBUST CODE FENCE REMOVAL ---
-    # Remove `````` from start
-    if response_text.startswith("```"):
-        # Find the first newline after ```
-        first_newline = response_text.find('\n')
-        if first_newline != -1:
-            response_text = response_text[first_newline + 1:]
-    
-    # Remove ```
-    if response_text.endswith("```"):
-        response_text = response_text[:-3].strip()
-    
-    # --- END ROBUST REMOVAL ---
-    
-    try:
-        mapping = json.loads(response_text)
-        for k in ["property_type", "size", "age", "address"]:
-            if k not in mapping:
-                mapping[k] = None
-        return mapping
-    except Exception:
-        raise ValueError(f"LLM failed to extract mapping. Got: {response_text}")
+    for k in ["property_type", "size", "age", "address"]:
+        if k not in mapping:
+            mapping[k] = None
+    return mapping
+
+
+def is_year_built_column(column):
+    """True when an 'age' column actually holds a construction year (e.g. year_built, char_yrblt)."""
+    if not column:
+        return False
+    return "year" in column.lower() or get_mapper().match(column)[0] == "year_built"
+
+
+def prepare_scoring_columns(df, mapping):
+    """Coerce size/age to numbers and turn a year-built column into an age (updates mapping)."""
+    # Handle numeric conversions
+    for k in ["size", "age"]:
+        col = mapping.get(k)
+        if col and col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # Handle year-built as age
+    if is_year_built_column(mapping.get("age")):
+        df["__computed_age"] = 2024 - pd.to_numeric(df[mapping["age"]], errors="coerce")
+        mapping["age"] = "__computed_age"
+    return df, mapping
+
+
+def file_signature(path: str):
+    """(mtime, size) of a file, or of the newest file under a partitioned dataset directory."""
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    newest, total = 0, 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            st = os.stat(os.path.join(root, name))
+            newest, total = max(newest, st.st_mtime_ns), total + st.st_size
+    return newest, total
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; works on scalars and NumPy arrays alike (within ~0.5% of geodesic)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
 
 
 def geo_distance_km(coord1, coord2):